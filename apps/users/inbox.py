@@ -0,0 +1,66 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from buddy_mentorship.models import BuddyRequest
+from buddy_mentorship.pagination import KeysetPaginator
+
+from .models import User
+
+INBOX_PAGE_SIZE = 50
+
+
+@dataclass
+class Inbox:
+    """
+    A page of the requests and offers a user has sent or received, split by
+    type and direction. The pending ones the user has received come first, so
+    newer activity never pushes them onto a later page, then the rest, newest
+    first. Loaded with a single query.
+    """
+
+    requests_sent: List[BuddyRequest] = field(default_factory=list)
+    requests_received: List[BuddyRequest] = field(default_factory=list)
+    offers_sent: List[BuddyRequest] = field(default_factory=list)
+    offers_received: List[BuddyRequest] = field(default_factory=list)
+    # pass as before to load the next (older) page, None on the last page
+    next_cursor: Optional[str] = None
+    is_first_page: bool = True
+
+    @classmethod
+    def load(
+        cls, user: User, before: Optional[str] = None, page_size: Optional[int] = None
+    ) -> "Inbox":
+        """
+        user: whose inbox to load \n
+        before: a previous next_cursor, the first page if empty or invalid \n
+        page_size: how many requests to load across all four lists,
+        INBOX_PAGE_SIZE by default
+        """
+        buddy_requests = BuddyRequest.objects.inbox(user).annotate(
+            pending=Case(
+                When(Q(requestee=user, status=BuddyRequest.Status.NEW), then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        paginator = KeysetPaginator(
+            buddy_requests,
+            ["pending", "id"],
+            page_size or INBOX_PAGE_SIZE,
+            # cursors only work for the inbox they were made for
+            salt=f"inbox:{user.id}",
+        )
+        page = paginator.page(before)
+
+        inbox = cls(next_cursor=page.next_cursor, is_first_page=not page.has_previous())
+        for buddy_request in page:
+            kind = (
+                "requests"
+                if buddy_request.request_type == BuddyRequest.RequestType.REQUEST
+                else "offers"
+            )
+            direction = "sent" if buddy_request.requestor_id == user.id else "received"
+            getattr(inbox, f"{kind}_{direction}").append(buddy_request)
+        return inbox
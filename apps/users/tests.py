@@ -1,4 +1,8 @@
+from unittest import mock
+
+from django.db import connection
 from django.test import TransactionTestCase, TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
 from django.conf import settings
 from selenium.webdriver.chrome.webdriver import WebDriver
@@ -290,3 +294,110 @@ class RequestListTest(TestCase):
 
         assert not response.context["requests_received"]
         assert not response.context["offers_received"]
+
+    def test_one_query_for_requests(self):
+        user = User.objects.get(email="user0@buddy.com")
+        for i in range(2):
+            for request_type in BuddyRequest.RequestType:
+                BuddyRequest.objects.create(
+                    requestor=user,
+                    requestee=User.objects.get(email=f"requestee{i}@buddy.com"),
+                    request_type=request_type,
+                )
+                BuddyRequest.objects.create(
+                    requestee=user,
+                    requestor=User.objects.get(email=f"requestor{i}@buddy.com"),
+                    request_type=request_type,
+                )
+
+        c = Client()
+        c.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get("/requests/")
+        assert response.status_code == 200
+        buddy_request_queries = [
+            query
+            for query in queries.captured_queries
+            if "buddy_mentorship_buddyrequest" in query["sql"]
+        ]
+        assert len(buddy_request_queries) == 1
+        # the users on each row came with it
+        assert len(queries.captured_queries) <= 3
+        assert b"requestor1" in response.content
+        assert b"requestee1" in response.content
+
+    @mock.patch("apps.users.inbox.INBOX_PAGE_SIZE", 3)
+    def test_pages(self):
+        user = User.objects.get(email="user0@buddy.com")
+        requestee = User.objects.get(email="requestee0@buddy.com")
+        buddy_requests = [
+            BuddyRequest.objects.create(
+                requestor=user,
+                requestee=requestee,
+                request_type=BuddyRequest.RequestType.REQUEST,
+            )
+            for i in range(7)
+        ]
+        rejected = buddy_requests.pop(3)
+        rejected.status = BuddyRequest.Status.REJECTED
+        rejected.save()
+
+        c = Client()
+        c.force_login(user)
+        seen = []
+        response = c.get("/requests/")
+        assert response.context["is_first_page"]
+        while True:
+            page = response.context["requests_sent"]
+            assert len(page) <= 3
+            seen.extend(page)
+            next_cursor = response.context["next_cursor"]
+            if next_cursor is None:
+                break
+            assert f"?before={next_cursor}".encode() in response.content
+            response = c.get("/requests/", {"before": next_cursor})
+            assert not response.context["is_first_page"]
+        assert seen == buddy_requests[::-1]
+
+    @mock.patch("apps.users.inbox.INBOX_PAGE_SIZE", 3)
+    def test_pending_received_on_first_page(self):
+        user = User.objects.get(email="user0@buddy.com")
+        requestee = User.objects.get(email="requestee0@buddy.com")
+        requestor = User.objects.get(email="requestor0@buddy.com")
+        pending = BuddyRequest.objects.create(
+            requestor=requestor,
+            requestee=user,
+            request_type=BuddyRequest.RequestType.REQUEST,
+        )
+        for i in range(4):
+            BuddyRequest.objects.create(
+                requestor=user,
+                requestee=requestee,
+                request_type=BuddyRequest.RequestType.REQUEST,
+            )
+
+        c = Client()
+        c.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get("/requests/")
+        assert response.context["requests_received"] == [pending]
+        assert len(response.context["requests_sent"]) == 2
+        assert b"You have not sent any offers" in response.content
+        assert 1 == sum(
+            "buddy_mentorship_buddyrequest" in query["sql"]
+            for query in queries.captured_queries
+        )
+
+        response = c.get("/requests/", {"before": response.context["next_cursor"]})
+        assert not response.context["is_first_page"]
+        assert not response.context["requests_received"]
+        assert len(response.context["requests_sent"]) == 2
+        assert response.context["next_cursor"] is None
+
+    def test_invalid_cursor(self):
+        user = User.objects.get(email="user0@buddy.com")
+        c = Client()
+        c.force_login(user)
+        response = c.get("/requests/", {"before": "nope"})
+        assert response.status_code == 200
+        assert response.context["is_first_page"]
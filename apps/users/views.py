@@ -5,30 +5,20 @@ from django.urls import reverse
 
 from buddy_mentorship.models import BuddyRequest, Profile
 
+from .inbox import Inbox
+
 
 @login_required(login_url="login")
 def requests_list(request):
-    requests_sent = BuddyRequest.objects.filter(
-        requestor=request.user, request_type=BuddyRequest.RequestType.REQUEST,
-    ).exclude(status=BuddyRequest.Status.REJECTED)
-
-    requests_received = BuddyRequest.objects.filter(
-        requestee=request.user, request_type=BuddyRequest.RequestType.REQUEST
-    ).exclude(status=BuddyRequest.Status.REJECTED)
-
-    offers_sent = BuddyRequest.objects.filter(
-        requestor=request.user, request_type=BuddyRequest.RequestType.OFFER
-    ).exclude(status=BuddyRequest.Status.REJECTED)
-
-    offers_received = BuddyRequest.objects.filter(
-        requestee=request.user, request_type=BuddyRequest.RequestType.OFFER
-    ).exclude(status=BuddyRequest.Status.REJECTED)
+    inbox = Inbox.load(request.user, before=request.GET.get("before"))
 
     context = {
-        "requests_sent": requests_sent,
-        "requests_received": requests_received,
-        "offers_sent": offers_sent,
-        "offers_received": offers_received,
+        "requests_sent": inbox.requests_sent,
+        "requests_received": inbox.requests_received,
+        "offers_sent": inbox.offers_sent,
+        "offers_received": inbox.offers_received,
+        "next_cursor": inbox.next_cursor,
+        "is_first_page": inbox.is_first_page,
         "title": "Requests",
         "active_page": "requests",
     }
@@ -40,10 +30,13 @@ def request_detail(request, request_id: int):
     buddy_request = get_object_or_404(BuddyRequest, pk=request_id)
     if not user_can_access_request(request.user, buddy_request):
         return HttpResponseForbidden("You do not have access to this request")
+    profiles = Profile.objects.for_users(
+        [buddy_request.requestor, buddy_request.requestee]
+    )
     context = {
         "buddy_request": buddy_request,
-        "requestor_profile": Profile.objects.get(user=buddy_request.requestor).id,
-        "requestee_profile": Profile.objects.get(user=buddy_request.requestee).id,
+        "requestor_profile": profiles[buddy_request.requestor_id].id,
+        "requestee_profile": profiles[buddy_request.requestee_id].id,
     }
     return render(request, "users/request.html", context)
 
@@ -1,6 +1,18 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
 
-from .models import BuddyRequest, Profile, Skill, Experience
+from .budget import budget_report, take_snapshot
+from .models import (
+    BuddyRequest,
+    Profile,
+    Skill,
+    Experience,
+    MetricsSnapshot,
+    OutboundEmail,
+    TableSizeSnapshot,
+)
 
 
 @admin.register(BuddyRequest)
@@ -28,3 +40,63 @@ class SkillAdmin(admin.ModelAdmin):
 @admin.register(Experience)
 class ExperienceAdmin(admin.ModelAdmin):
     fields = ["profile", "skill", "level", "exp_type"]
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ["subject", "recipient", "status", "attempts", "created"]
+    list_filter = ["status"]
+    fields = [
+        "subject",
+        "recipient",
+        "from_email",
+        "body",
+        "html_body",
+        "status",
+        "attempts",
+        "last_error",
+        "send_after",
+        "sent_at",
+    ]
+
+
+@admin.register(MetricsSnapshot)
+class MetricsSnapshotAdmin(admin.ModelAdmin):
+    list_display = ["machine", "published_at"]
+    fields = ["machine", "published_at"]
+    readonly_fields = ["machine", "published_at"]
+
+
+@admin.register(TableSizeSnapshot)
+class TableSizeSnapshotAdmin(admin.ModelAdmin):
+    """
+    Shows the row budget dashboard instead of a list of snapshots.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        exact = request.GET.get("exact") == "1"
+        report = budget_report(exact=exact)
+        if request.method == "POST":
+            take_snapshot(report)
+            self.message_user(request, f"Saved a snapshot of {report.total} rows.")
+            # so reloading the page doesn't save another one
+            return HttpResponseRedirect(request.get_full_path())
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Database row budget",
+            "opts": self.model._meta,
+            "report": report,
+            "snapshots": TableSizeSnapshot.objects.order_by("-taken_at")[:30],
+            **(extra_context or {}),
+        }
+        return TemplateResponse(
+            request, "admin/buddy_mentorship/tablesizesnapshot/dashboard.html", context
+        )
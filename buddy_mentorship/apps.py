@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class BuddyMentorshipConfig(AppConfig):
+    name = "buddy_mentorship"
+
+    def ready(self):
+        from . import signals  # noqa: F401
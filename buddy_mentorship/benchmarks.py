@@ -0,0 +1,472 @@
+"""
+Synthetic data for load testing, and view benchmarks against it.
+
+seed() generates users, profiles, skills, experiences and buddy requests at a
+given scale. The same arguments always generate the same rows, so timings from
+different runs compare like for like. Seeded users have @bench.buddy emails
+and are removed with clear().
+
+benchmark_views() times the main pages as a seeded user and counts their
+queries; see the seed_benchmark_data and benchmark_views commands.
+load_test() measures the throughput of a running server under concurrent
+requests, to compare deployments (see the load_test command).
+"""
+import datetime as dt
+import http.client
+import random
+import statistics
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.users.models import User
+
+from .models import BuddyRequest, Experience, Profile, ProfileEligibility, Skill
+from .skills import invalidate_vocabulary
+
+EMAIL_DOMAIN = "bench.buddy"
+BATCH_SIZE = 1000
+
+# rows are dated relative to this, not to now, so reruns generate the same data
+EPOCH = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+
+# fmt: off
+SKILLS = [
+    "python", "django", "flask", "fastapi", "pandas", "numpy", "scipy",
+    "matplotlib", "jupyter", "pytest", "sqlalchemy", "postgresql", "mysql",
+    "sqlite", "redis", "celery", "docker", "kubernetes", "aws", "gcp", "azure",
+    "linux", "bash", "git", "javascript", "typescript", "react", "vue", "html",
+    "css", "rest apis", "graphql", "machine learning", "deep learning",
+    "pytorch", "tensorflow", "scikit-learn", "nlp", "computer vision",
+    "data engineering", "airflow", "spark", "dask", "asyncio", "cython",
+    "packaging", "type hints", "testing", "debugging", "profiling", "security",
+    "web scraping", "beautifulsoup", "selenium", "ci/cd", "terraform",
+    "networking", "algorithms", "data structures", "statistics", "excel",
+    "tableau", "open source", "public speaking", "career advice", "interviewing",
+    "code review", "refactoring", "design patterns", "functional programming",
+    "micropython", "raspberry pi", "game development", "pygame", "gis",
+    "bioinformatics", "finance", "devops", "documentation", "sphinx",
+]
+
+FIRST_NAMES = [
+    "Ada", "Alan", "Barbara", "Carlos", "Dana", "Elena", "Farah", "Grace",
+    "Hiro", "Ines", "Jamal", "Kira", "Luis", "Maya", "Nia", "Omar", "Priya",
+    "Quinn", "Rosa", "Sam", "Tariq", "Uma", "Victor", "Wen", "Yusuf", "Zoe",
+]
+
+LAST_NAMES = [
+    "Adams", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes",
+    "Ito", "Jones", "Kowalski", "Lopez", "Muller", "Nguyen", "Okafor", "Patel",
+    "Rossi", "Singh", "Tanaka", "Walker", "Young", "Zhang",
+]
+# fmt: on
+
+BIOS = [
+    "I write {skill} at work and want to get better at {other}.",
+    "Data person who mostly uses {skill}. Happy to talk about {other} too.",
+    "Career changer learning {skill}, looking for someone who knows {other}.",
+    "I have taught {skill} workshops and would love to learn {other}.",
+    "Backend developer, {skill} by day and {other} by night.",
+]
+
+
+@dataclass
+class SeedResult:
+    users: int = 0
+    skills: int = 0
+    experiences: int = 0
+    requests: int = 0
+
+    def __str__(self):
+        return (
+            f"{self.users} users and profiles, {self.skills} new skills, "
+            f"{self.experiences} experiences, {self.requests} buddy requests"
+        )
+
+
+def seed(
+    profiles: int = 1000,
+    experiences: int = 10,
+    requests: int = 2,
+    skills: int = 200,
+    seed: int = 0,
+) -> SeedResult:
+    """
+    Generates the same data for the same arguments, in one transaction.
+
+    profiles: number of users, each with one profile \n
+    experiences: average number of experiences per profile \n
+    requests: average number of buddy requests sent per user \n
+    skills: number of skills experiences are drawn from, the most popular
+    ones being much more common, like real skills \n
+    seed: seed of the random generator
+    """
+    rng = random.Random(seed)
+    result = SeedResult()
+    with transaction.atomic():
+        start = User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").count()
+        users = _seed_users(rng, start, profiles)
+        result.users = len(users)
+        skill_ids, result.skills = _seed_skills(skills)
+        seeded = _seed_profiles(rng, users)
+        result.experiences = _seed_experiences(rng, seeded, skill_ids, experiences)
+        result.requests = _seed_requests(rng, users, requests)
+    if result.skills:
+        invalidate_vocabulary()
+    return result
+
+
+def _seed_users(rng: random.Random, start: int, n: int) -> List[User]:
+    users = []
+    for i in range(start, start + n):
+        users.append(
+            User(
+                email=f"user{i}@{EMAIL_DOMAIN}",
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                # bulk_create doesn't call set_unusable_password
+                password="!",
+                is_active=rng.random() < 0.97,
+                date_joined=EPOCH + dt.timedelta(minutes=rng.randrange(525600)),
+            )
+        )
+    # postgres returns the ids of bulk created rows
+    return User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+
+
+def _skill_names(n: int) -> List[str]:
+    names = SKILLS[:n]
+    for i in range(n - len(names)):
+        names.append(f"{SKILLS[i % len(SKILLS)]} {i // len(SKILLS) + 2}")
+    return names
+
+
+def _seed_skills(n: int):
+    """
+    Returns the ids of the n benchmark skills, most popular first, and how
+    many had to be created.
+    """
+    names = _skill_names(n)
+    existing = set(
+        Skill.objects.filter(skill__in=names).values_list("skill", flat=True)
+    )
+    # bulk_create skips Skill.save, which titles display names
+    Skill.objects.bulk_create(
+        [
+            Skill(skill=name, display_name=name.title())
+            for name in names
+            if name not in existing
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    ids = dict(Skill.objects.filter(skill__in=names).values_list("skill", "id"))
+    return [ids[name] for name in names], len(names) - len(existing)
+
+
+def _seed_profiles(rng: random.Random, users: List[User]) -> List[Profile]:
+    profiles = [
+        Profile(
+            user=user,
+            bio=rng.choice(BIOS).format(
+                skill=rng.choice(SKILLS), other=rng.choice(SKILLS)
+            ),
+            looking_for_mentors=rng.random() < 0.7,
+            looking_for_mentees=rng.random() < 0.4,
+        )
+        for user in users
+    ]
+    return Profile.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+
+
+def _seed_experiences(
+    rng: random.Random, profiles: List[Profile], skill_ids: List[int], mean: int
+) -> int:
+    """
+    Creates the experiences and, since bulk_create skips the receivers in
+    signals.py, the eligibility records of profiles.
+    """
+    # Zipf-like popularity: the k-th skill is about k times rarer than the first
+    ranks = range(len(skill_ids))
+    weights = [1 / (rank + 1) for rank in ranks]
+    experiences = []
+    eligibilities = []
+    for profile in profiles:
+        count = min(rng.randint(0, 2 * mean), len(skill_ids))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(rng.choices(ranks, weights, k=count - len(chosen)))
+        types = set()
+        for rank in sorted(chosen):
+            exp_type = rng.choice(Experience.Type.values)
+            types.add(exp_type)
+            experiences.append(
+                Experience(
+                    profile=profile,
+                    skill_id=skill_ids[rank],
+                    level=rng.randint(1, 5),
+                    exp_type=exp_type,
+                )
+            )
+        eligibilities.append(
+            ProfileEligibility(
+                profile=profile,
+                has_can_help=Experience.Type.CAN_HELP in types,
+                has_want_help=Experience.Type.WANT_HELP in types,
+                looking_for_mentors=profile.looking_for_mentors,
+                looking_for_mentees=profile.looking_for_mentees,
+                is_active=profile.user.is_active,
+            )
+        )
+    Experience.objects.bulk_create(experiences, batch_size=BATCH_SIZE)
+    ProfileEligibility.objects.bulk_create(eligibilities, batch_size=BATCH_SIZE)
+    return len(experiences)
+
+
+def _seed_requests(rng: random.Random, users: List[User], mean: int) -> int:
+    if len(users) < 2:
+        return 0
+    statuses = BuddyRequest.Status.values
+    requests = {}
+    for requestor in users:
+        for _ in range(rng.randint(0, 2 * mean)):
+            requestee = rng.choice(users)
+            request_type = rng.choice(BuddyRequest.RequestType.values)
+            key = (requestor.id, requestee.id, request_type)
+            if requestee.id == requestor.id or key in requests:
+                continue
+            requests[key] = BuddyRequest(
+                requestor=requestor,
+                requestee=requestee,
+                request_type=request_type,
+                status=rng.choices(statuses, [50, 25, 15, 10])[0],
+                request_sent=EPOCH + dt.timedelta(minutes=rng.randrange(525600)),
+                message=f"Hi {requestee.first_name}, would you like to pair up?",
+            )
+    BuddyRequest.objects.bulk_create(requests.values(), batch_size=BATCH_SIZE)
+    return len(requests)
+
+
+def clear():
+    """
+    Deletes every seeded user with their profiles, experiences and requests,
+    returning the number of users deleted.
+
+    Seeded rows are deleted with plain SQL: Django's cascade would load them
+    all to send delete signals, whose receivers only matter for real users.
+    """
+    tables = {
+        "users": User._meta.db_table,
+        "profiles": Profile._meta.db_table,
+        "experiences": Experience._meta.db_table,
+        "eligibility": ProfileEligibility._meta.db_table,
+        "requests": BuddyRequest._meta.db_table,
+    }
+    seeded = f"SELECT id FROM {tables['users']} WHERE email LIKE %s"
+    seeded_profiles = f"SELECT id FROM {tables['profiles']} WHERE user_id IN ({seeded})"
+    pattern = f"%@{EMAIL_DOMAIN}"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {tables['requests']} "
+            f"WHERE requestor_id IN ({seeded}) OR requestee_id IN ({seeded})",
+            [pattern, pattern],
+        )
+        for table in ["experiences", "eligibility"]:
+            cursor.execute(
+                f"DELETE FROM {tables[table]} WHERE profile_id IN ({seeded_profiles})",
+                [pattern],
+            )
+        cursor.execute(
+            f"DELETE FROM {tables['profiles']} WHERE user_id IN ({seeded})", [pattern]
+        )
+        cursor.execute(f"DELETE FROM {tables['users']} WHERE email LIKE %s", [pattern])
+        deleted = cursor.rowcount
+    return deleted
+
+
+@dataclass
+class ViewTiming:
+    view: str
+    # milliseconds
+    median: float
+    p95: float
+    queries: int
+
+
+def benchmark_views(iterations: int = 20) -> List[ViewTiming]:
+    """
+    Times each page iterations times as the first seeded user who can search
+    for mentors, after one untimed request to warm up caches.
+    Query counts are those of the last request.
+    """
+    viewer = _viewer()
+    other = (
+        Profile.objects.filter(user__email__endswith=f"@{EMAIL_DOMAIN}")
+        .exclude(id=viewer.id)
+        .order_by("id")
+        .first()
+    )
+    search_term = (
+        Experience.objects.filter(profile=viewer, exp_type=Experience.Type.WANT_HELP)
+        .values_list("skill__skill", flat=True)
+        .first()
+    )
+
+    pages = {
+        "search": f"{reverse('search')}?"
+        + urllib.parse.urlencode({"type": "mentor", "q": search_term}),
+        "search (no query)": f"{reverse('search')}?type=mentor",
+        "profile": reverse("profile", args=[(other or viewer).id]),
+        "your profile": reverse("your_profile"),
+        "requests": reverse("requests"),
+    }
+    client = _client()
+    client.force_login(viewer.user)
+    timings = []
+    for view, url in pages.items():
+        client.get(url, secure=True)
+        elapsed = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url, secure=True)
+                elapsed.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise ValueError(f"{url} returned {response.status_code}")
+        timings.append(
+            ViewTiming(
+                view=view,
+                median=statistics.median(elapsed),
+                p95=_percentile(elapsed, 95),
+                queries=len(queries),
+            )
+        )
+    return timings
+
+
+@dataclass
+class LoadResult:
+    concurrency: int
+    requests: int
+    # responses other than 200, and failed connections
+    errors: int
+    seconds: float
+    # milliseconds
+    median: float
+    p95: float
+
+    @property
+    def throughput(self) -> float:
+        """
+        Requests per second
+        """
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+def load_test(
+    base_url: str, concurrency: int, requests: int, paths: List[str] = None
+) -> LoadResult:
+    """
+    Sends requests to a running server from concurrency threads, each with
+    its own keep-alive connection, as the first seeded user who can search for
+    mentors. Paths are requested in turn, by default the skill autocomplete,
+    a search and a profile.
+
+    base_url: e.g. "http://localhost:8000" \n
+    concurrency: requests in flight at once \n
+    requests: total requests to send
+    """
+    viewer = _viewer()
+    client = _client()
+    client.force_login(viewer.user)
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    if not paths:
+        paths = [
+            f"{reverse('skill_search')}?term={SKILLS[0][:2]}",
+            f"{reverse('search')}?type=mentor",
+            reverse("profile", args=[viewer.id]),
+        ]
+
+    url = urllib.parse.urlsplit(base_url)
+    connection_class = (
+        http.client.HTTPSConnection
+        if url.scheme == "https"
+        else http.client.HTTPConnection
+    )
+    prefix = url.path.rstrip("/")
+
+    def run(worker: int) -> List[Optional[float]]:
+        """
+        Latency in milliseconds of each request of worker, None for errors
+        """
+        latencies = []
+        http_connection = connection_class(url.netloc, timeout=30)
+        for i in range(worker, requests, concurrency):
+            start = time.perf_counter()
+            try:
+                http_connection.request(
+                    "GET", prefix + paths[i % len(paths)], headers={"Cookie": cookie}
+                )
+                response = http_connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                http_connection.close()
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000 if ok else None)
+        http_connection.close()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    latencies = [latency for result in results for latency in result]
+    succeeded = [latency for latency in latencies if latency is not None]
+    return LoadResult(
+        concurrency=concurrency,
+        requests=len(latencies),
+        errors=len(latencies) - len(succeeded),
+        seconds=seconds,
+        median=statistics.median(succeeded) if succeeded else 0.0,
+        p95=_percentile(succeeded, 95) if succeeded else 0.0,
+    )
+
+
+def _viewer() -> Profile:
+    viewer = (
+        Profile.objects.filter(
+            user__email__endswith=f"@{EMAIL_DOMAIN}",
+            eligibility__has_want_help=True,
+            eligibility__is_active=True,
+        )
+        .select_related("user")
+        .order_by("id")
+        .first()
+    )
+    if viewer is None:
+        raise ValueError("No seeded user to benchmark with, run seed() first")
+    return viewer
+
+
+def _client() -> Client:
+    """
+    A test client whose requests pass ALLOWED_HOSTS outside of tests.
+    """
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != "*"]
+    host = hosts[0].lstrip(".") if hosts else "testserver"
+    return Client(SERVER_NAME=host)
+
+
+def _percentile(values: List[float], percent: int) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
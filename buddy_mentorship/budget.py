@@ -0,0 +1,178 @@
+"""
+Tracks the number of rows in the database against the plan's limit
+(DB_ROW_LIMIT rows across every table, 10k on Heroku's hobby plans).
+
+Counts come from the planner's statistics (pg_class.reltuples), which cost
+nothing to read but are only as fresh as the last (auto)vacuum or analyze, or
+from exact COUNT(*)s on demand. Snapshots of the counts are kept in
+TableSizeSnapshot, one a day by default, to measure how fast each table grows.
+"""
+import datetime as dt
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import TableSizeSnapshot
+
+logger = logging.getLogger(__name__)
+
+# snapshots older than this are deleted, the history table counts toward the limit too
+HISTORY_DAYS = 90
+
+ESTIMATES = """
+SELECT c.relname, c.reltuples::bigint
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')
+"""
+
+
+def estimated_counts() -> Dict[str, int]:
+    """
+    Rows per table according to the planner. Tables that have never been
+    analyzed have no estimate (-1, or 0 before Postgres 14) and are counted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(ESTIMATES)
+        counts = dict(cursor.fetchall())
+    for table, rows in counts.items():
+        if rows <= 0:
+            counts[table] = _count(table)
+    return counts
+
+
+def exact_counts() -> Dict[str, int]:
+    with connection.cursor() as cursor:
+        cursor.execute(ESTIMATES)
+        tables = [table for table, rows in cursor.fetchall()]
+    return {table: _count(table) for table in tables}
+
+
+def _count(table: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+@dataclass
+class TableBudget:
+    table: str
+    rows: int
+    # rows added per day since the baseline snapshot, None without one
+    growth_per_day: Optional[float] = None
+
+
+@dataclass
+class BudgetReport:
+    tables: List[TableBudget]
+    limit: int
+    warning_share: float
+    exact: bool
+    baseline: Optional[TableSizeSnapshot] = None
+
+    @property
+    def total(self) -> int:
+        return sum(table.rows for table in self.tables)
+
+    @property
+    def share(self) -> float:
+        return self.total / self.limit if self.limit else 0.0
+
+    @property
+    def status(self) -> str:
+        """
+        "ok", "warning" from warning_share of the limit, or "over"
+        """
+        if self.total >= self.limit:
+            return "over"
+        if self.share >= self.warning_share:
+            return "warning"
+        return "ok"
+
+    @property
+    def growth_per_day(self) -> Optional[float]:
+        if self.baseline is None:
+            return None
+        return sum(table.growth_per_day or 0 for table in self.tables)
+
+    @property
+    def days_left(self) -> Optional[float]:
+        """
+        Days until the limit is reached at the current growth rate, None if
+        the database isn't growing.
+        """
+        growth = self.growth_per_day
+        if not growth or growth <= 0:
+            return None
+        return max(self.limit - self.total, 0) / growth
+
+
+def budget_report(exact: bool = False, days: int = 7) -> BudgetReport:
+    """
+    The rows of each table, largest first, with their growth per day since
+    the latest snapshot at least days old (or the oldest one, if none is).
+    """
+    counts = exact_counts() if exact else estimated_counts()
+    now = timezone.now()
+    snapshots = TableSizeSnapshot.objects.filter(
+        taken_at__lt=now - dt.timedelta(hours=1)
+    )
+    baseline = (
+        snapshots.filter(taken_at__lte=now - dt.timedelta(days=days))
+        .order_by("-taken_at")
+        .first()
+        or snapshots.order_by("taken_at").first()
+    )
+    tables = []
+    for table, rows in counts.items():
+        growth = None
+        if baseline is not None:
+            elapsed_days = (now - baseline.taken_at).total_seconds() / 86400
+            growth = (rows - baseline.rows.get(table, 0)) / elapsed_days
+        tables.append(TableBudget(table=table, rows=rows, growth_per_day=growth))
+    tables.sort(key=lambda table: (-table.rows, table.table))
+    return BudgetReport(
+        tables=tables,
+        limit=settings.DB_ROW_LIMIT,
+        warning_share=settings.DB_ROW_WARNING,
+        exact=exact,
+        baseline=baseline,
+    )
+
+
+def take_snapshot(report: BudgetReport) -> TableSizeSnapshot:
+    """
+    Saves the counts of report and deletes snapshots older than HISTORY_DAYS.
+    """
+    snapshot = TableSizeSnapshot.objects.create(
+        exact=report.exact, rows={table.table: table.rows for table in report.tables}
+    )
+    TableSizeSnapshot.objects.filter(
+        taken_at__lt=timezone.now() - dt.timedelta(days=HISTORY_DAYS)
+    ).delete()
+    return snapshot
+
+
+def check_budget(days: int = 7) -> BudgetReport:
+    """
+    Takes a snapshot from the estimates and logs a warning when the database
+    is close to or over its row limit, for the worker to run daily.
+    """
+    report = budget_report(days=days)
+    take_snapshot(report)
+    if report.status != "ok":
+        largest = ", ".join(
+            f"{table.table} ({table.rows})" for table in report.tables[:3]
+        )
+        logger.warning(
+            "Database has %s of its %s row limit (%.0f%%), largest tables: %s",
+            report.total,
+            report.limit,
+            report.share * 100,
+            largest,
+        )
+    return report
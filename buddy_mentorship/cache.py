@@ -0,0 +1,215 @@
+"""
+Namespaced, versioned access to the default cache.
+
+    profiles = Namespace("profiles", ttl=600)
+    card = profiles.get_or_set(f"card:{profile.id}", lambda: render_card(profile))
+    profiles.invalidate()  # drops every profiles entry at once
+
+Hits and misses are counted per namespace in each process and added to shared
+totals in the cache every FLUSH_EVERY lookups; see the cache_stats command.
+"""
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+FLUSH_EVERY = 100
+STATS_NAMESPACES_KEY = "cache_stats:namespaces"
+
+_MISSING = object()
+_pending = Counter()  # (namespace, "hits" | "misses") -> count not yet flushed
+_pending_lock = threading.Lock()
+
+
+class Namespace:
+    """
+    A group of cache entries sharing a key prefix and a version.
+    Bumping the version with invalidate() orphans every entry in the namespace;
+    they are never read again and expire on their own.
+    """
+
+    def __init__(self, name: str, ttl=DEFAULT_TIMEOUT):
+        """
+        name: prefix for the keys, e.g. "skills" \n
+        ttl: default lifetime of entries in seconds (None never expires),
+        CACHES["default"]["TIMEOUT"] if not given
+        """
+        self.name = name
+        self.ttl = ttl
+        self._version_key = f"{name}:version"
+
+    def __repr__(self):
+        return f"<Namespace {self.name}>"
+
+    def version(self) -> int:
+        """
+        The current version of the namespace. It starts at the current time
+        rather than 1, so a version lost with the cache never comes back.
+        """
+        return _current_version(self._version_key)
+
+    def invalidate(self):
+        _bump_version(self._version_key)
+
+    def stamp(self, key) -> str:
+        """
+        A version for one entry of the namespace, for keys built elsewhere
+        (e.g. by the {% cache %} template tag) that vary on it.
+        It changes with touch(key) and with invalidate().
+        """
+        version_keys = [self._version_key, self._stamp_key(key)]
+        found = cache.get_many(version_keys)
+        return "-".join(
+            str(
+                found[version_key]
+                if version_key in found
+                else _current_version(version_key)
+            )
+            for version_key in version_keys
+        )
+
+    def touch(self, key):
+        """
+        Changes the stamp of key.
+        """
+        _bump_version(self._stamp_key(key))
+
+    def _stamp_key(self, key) -> str:
+        return f"{self.name}:stamp:{key}"
+
+    def key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key: str, default=None):
+        value = cache.get(self.key(key), _MISSING, version=self.version())
+        self.count(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key: str, value: Any, ttl=_MISSING):
+        cache.set(
+            self.key(key),
+            value,
+            self.ttl if ttl is _MISSING else ttl,
+            version=self.version(),
+        )
+
+    def get_or_set(self, key: str, default: Callable[[], Any], ttl=_MISSING):
+        """
+        The cached value for key, computing and caching default() on a miss.
+        """
+        version = self.version()
+        value = cache.get(self.key(key), _MISSING, version=version)
+        self.count(value is not _MISSING)
+        if value is _MISSING:
+            value = default()
+            cache.set(
+                self.key(key),
+                value,
+                self.ttl if ttl is _MISSING else ttl,
+                version=version,
+            )
+        return value
+
+    def delete(self, key: str):
+        cache.delete(self.key(key), version=self.version())
+
+    def count(self, hit: bool):
+        """
+        Records a hit or miss, for caches kept outside of Django's cache too.
+        """
+        with _pending_lock:
+            _pending[(self.name, "hits" if hit else "misses")] += 1
+            pending = sum(_pending.values())
+        if pending >= FLUSH_EVERY:
+            flush_stats()
+
+
+def _current_version(version_key: str) -> int:
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key, 0)
+    return version
+
+
+def _bump_version(version_key: str):
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, time.time_ns(), None)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+def _stats_key(namespace: str, outcome: str) -> str:
+    return f"cache_stats:{namespace}:{outcome}"
+
+
+def flush_stats():
+    """
+    Adds this process' counts to the totals kept in the cache.
+    """
+    with _pending_lock:
+        counts = dict(_pending)
+        _pending.clear()
+    if not counts:
+        return
+    for (namespace, outcome), count in counts.items():
+        key = _stats_key(namespace, outcome)
+        if not cache.add(key, count, None):
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+    namespaces = set(cache.get(STATS_NAMESPACES_KEY, ()))
+    new = {namespace for namespace, outcome in counts} - namespaces
+    if new:
+        cache.set(STATS_NAMESPACES_KEY, sorted(namespaces | new), None)
+
+
+def get_stats() -> Dict[str, CacheStats]:
+    """
+    Hits and misses per namespace, across every process sharing the cache.
+    """
+    flush_stats()
+    namespaces = cache.get(STATS_NAMESPACES_KEY, ())
+    keys = {
+        _stats_key(namespace, outcome): (namespace, outcome)
+        for namespace in namespaces
+        for outcome in ["hits", "misses"]
+    }
+    stats = {namespace: CacheStats() for namespace in namespaces}
+    for key, value in cache.get_many(list(keys)).items():
+        namespace, outcome = keys[key]
+        setattr(stats[namespace], outcome, value)
+    return stats
+
+
+def reset_stats():
+    with _pending_lock:
+        _pending.clear()
+    namespaces = cache.get(STATS_NAMESPACES_KEY, ())
+    cache.delete_many(
+        [
+            _stats_key(namespace, outcome)
+            for namespace in namespaces
+            for outcome in ["hits", "misses"]
+        ]
+        + [STATS_NAMESPACES_KEY]
+    )
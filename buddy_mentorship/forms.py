@@ -1,5 +1,6 @@
 from django import forms
 from dal import autocomplete
+from .imports import FORMATS
 from .models import Experience
 
 
@@ -16,3 +17,11 @@ class SkillForm(forms.Form):
     skill = forms.CharField(max_length=50)
     level = forms.ChoiceField(choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)])
     exp_type = forms.ChoiceField(choices=[(0, 0), (1, 1)])
+
+
+class ExperienceImportForm(forms.Form):
+    file = forms.FileField()
+    format = forms.ChoiceField(
+        choices=[("", "From the file name")] + [(f, f.upper()) for f in FORMATS],
+        required=False,
+    )
@@ -0,0 +1,234 @@
+"""
+Bulk import of experiences from CSV or JSON, e.g. a meetup cohort's spreadsheet.
+
+Each row has an email, a skill, a level (1-5) and an exp_type ("can_help",
+"want_help" or the Experience.Type value), e.g. as CSV:
+
+    email,skill,level,exp_type
+    ada@example.com,Python,4,can_help
+    ada@example.com,Rust,1,want_help
+
+Rows for users that don't exist are skipped, new skills are created and
+experiences are upserted against the unique_skill constraint, so importing a
+file again updates levels and types instead of failing.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Min
+from django.db.models.functions import Lower
+
+from apps.users.models import User
+
+from .models import Experience, Profile, ProfileEligibility, Skill
+from .skills import invalidate_vocabulary
+
+FORMATS = ["csv", "json"]
+COLUMNS = ["email", "skill", "level", "exp_type"]
+BATCH_SIZE = 500
+
+UPSERT_EXPERIENCES = """
+INSERT INTO {table} (profile_id, skill_id, level, exp_type)
+VALUES {values}
+ON CONFLICT ON CONSTRAINT unique_skill
+DO UPDATE SET level = EXCLUDED.level, exp_type = EXCLUDED.exp_type
+RETURNING (xmax = 0) AS inserted
+"""
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+@dataclass
+class ImportRow:
+    email: str
+    skill: str
+    level: int
+    exp_type: int
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    skills_created: int = 0
+    experiences_created: int = 0
+    experiences_updated: int = 0
+    profiles: int = 0
+    # emails without a user, whose rows were skipped
+    unknown_emails: List[str] = field(default_factory=list)
+
+    def __str__(self):
+        summary = (
+            f"{self.rows} rows: {self.experiences_created} experiences created, "
+            f"{self.experiences_updated} updated across {self.profiles} profiles, "
+            f"{self.skills_created} new skills"
+        )
+        if self.unknown_emails:
+            summary += f", skipped unknown emails {', '.join(self.unknown_emails)}"
+        return summary
+
+
+def parse_rows(data: str, format: str) -> Tuple[List[ImportRow], List[str]]:
+    """
+    Validates the rows of data, a CSV (with a header) or a JSON list of objects.
+    Returns the valid rows and an error message per invalid one.
+    """
+    if format == "csv":
+        records = list(csv.DictReader(io.StringIO(data)))
+        first_line = 2
+    elif format == "json":
+        try:
+            records = json.loads(data)
+        except json.JSONDecodeError as error:
+            raise InvalidImport(f"Invalid JSON: {error}")
+        if not isinstance(records, list):
+            raise InvalidImport("JSON imports must be a list of objects")
+        first_line = 1
+    else:
+        raise InvalidImport(f"Unknown format {format}, expected one of {FORMATS}")
+
+    exp_types = {exp_type.name.lower(): exp_type.value for exp_type in Experience.Type}
+    rows, errors = [], []
+    for line, record in enumerate(records, first_line):
+        label = f"Row {line}" if format == "csv" else f"Item {line}"
+        if not isinstance(record, dict):
+            errors.append(f"{label}: expected an object")
+            continue
+        missing = [
+            column
+            for column in COLUMNS
+            if record.get(column) is None or not str(record[column]).strip()
+        ]
+        if missing:
+            errors.append(f"{label}: missing {', '.join(missing)}")
+            continue
+        skill = str(record["skill"]).strip().lower()
+        if len(skill) > Skill._meta.get_field("skill").max_length:
+            errors.append(f"{label}: skill {skill} is too long")
+            continue
+        try:
+            level = int(record["level"])
+        except (TypeError, ValueError):
+            level = 0
+        if not 1 <= level <= 5:
+            errors.append(f"{label}: level must be 1 to 5, not {record['level']}")
+            continue
+        exp_type = str(record["exp_type"]).strip().lower()
+        if exp_type in exp_types:
+            exp_type = exp_types[exp_type]
+        elif exp_type in [str(value) for value in exp_types.values()]:
+            exp_type = int(exp_type)
+        else:
+            errors.append(
+                f"{label}: exp_type must be one of {', '.join(exp_types)}, "
+                f"not {record['exp_type']}"
+            )
+            continue
+        rows.append(
+            ImportRow(
+                email=str(record["email"]).strip(),
+                skill=skill,
+                level=level,
+                exp_type=exp_type,
+            )
+        )
+    return rows, errors
+
+
+def _profile_ids(emails: Iterable[str]) -> Dict[str, int]:
+    """
+    The (first) profile id of each email's user, the one Profile.objects.for_users
+    returns, creating missing profiles
+    """
+    users = {
+        user.email.lower(): user
+        for user in User.objects.annotate(lower_email=Lower("email")).filter(
+            lower_email__in=emails
+        )
+    }
+    first = (
+        Profile.objects.filter(user__in=users.values())
+        .values("user_id")
+        .annotate(profile_id=Min("id"))
+    )
+    by_user = {row["user_id"]: row["profile_id"] for row in first}
+    for user in users.values():
+        if user.id not in by_user:
+            by_user[user.id] = Profile.objects.create(user=user).id
+    return {email: by_user[user.id] for email, user in users.items()}
+
+
+def _skill_ids(names: Iterable[str]) -> Tuple[Dict[str, int], int]:
+    """
+    The id of each skill name, creating missing skills.
+    Returns the ids and how many skills were created.
+    """
+    names = set(names)
+    existing = dict(Skill.objects.filter(skill__in=names).values_list("skill", "id"))
+    new = sorted(names - set(existing))
+    if new:
+        # bulk_create skips Skill.save, which titles display names
+        Skill.objects.bulk_create(
+            [Skill(skill=name, display_name=name.title()) for name in new],
+            ignore_conflicts=True,
+        )
+        existing = dict(
+            Skill.objects.filter(skill__in=names).values_list("skill", "id")
+        )
+    return existing, len(new)
+
+
+def import_experiences(rows: List[ImportRow]) -> ImportResult:
+    """
+    Upserts the experiences in rows, in one transaction. When a file has
+    several rows for the same user and skill the last one wins.
+
+    Bulk writes skip model signals, so eligibility, profile page stamps and
+    the skill vocabulary are refreshed here afterwards.
+    """
+    result = ImportResult(rows=len(rows))
+    with transaction.atomic():
+        profile_ids = _profile_ids({row.email.lower() for row in rows})
+        result.unknown_emails = sorted(
+            {row.email for row in rows if row.email.lower() not in profile_ids}
+        )
+        rows = [row for row in rows if row.email.lower() in profile_ids]
+        skill_ids, result.skills_created = _skill_ids(row.skill for row in rows)
+
+        experiences = {}
+        for row in rows:
+            key = (profile_ids[row.email.lower()], skill_ids[row.skill])
+            experiences[key] = (row.level, row.exp_type)
+        values = [
+            (profile_id, skill_id, level, exp_type)
+            for (profile_id, skill_id), (level, exp_type) in experiences.items()
+        ]
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(values), BATCH_SIZE):
+                batch = values[start : start + BATCH_SIZE]
+                cursor.execute(
+                    UPSERT_EXPERIENCES.format(
+                        table=Experience._meta.db_table,
+                        values=", ".join(["(%s, %s, %s, %s)"] * len(batch)),
+                    ),
+                    [value for experience in batch for value in experience],
+                )
+                for (inserted,) in cursor.fetchall():
+                    if inserted:
+                        result.experiences_created += 1
+                    else:
+                        result.experiences_updated += 1
+
+        touched = sorted({profile_id for profile_id, skill_id in experiences})
+        result.profiles = len(touched)
+        ProfileEligibility.refresh_experiences(touched)
+        Profile.objects.touch(touched)
+    if result.skills_created:
+        invalidate_vocabulary()
+    return result
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from buddy_mentorship.models import Skill
+from buddy_mentorship.skills import get_vocabulary
+
+TERMS = ["p", "py", "dj", "data", "sql", "ml", "web", "x"]
+
+
+class Command(BaseCommand):
+    help = "Times skill autocomplete against the database and the vocabulary cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        limit = options["limit"]
+        strategies = {
+            "icontains": lambda term: list(
+                Skill.objects.filter(skill__icontains=term).values_list(
+                    "display_name", flat=True
+                )
+            ),
+            "autocomplete": lambda term: list(
+                Skill.objects.autocomplete(term, limit=limit).values_list(
+                    "display_name", flat=True
+                )
+            ),
+            "vocabulary": lambda term: get_vocabulary().search(term, limit=limit),
+        }
+        get_vocabulary()
+        self.stdout.write(
+            f"{Skill.objects.count()} skills, {iterations} iterations "
+            f"of {len(TERMS)} terms"
+        )
+        for name, search in strategies.items():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for term in TERMS:
+                    search(term)
+            elapsed = time.perf_counter() - start
+            per_call = elapsed / (iterations * len(TERMS)) * 1e6
+            self.stdout.write(f"{name:>12}: {per_call:10.1f} us per search")
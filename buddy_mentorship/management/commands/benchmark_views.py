@@ -0,0 +1,98 @@
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from buddy_mentorship import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the search, profile and requests pages and counts their queries "
+        "against generated data at one or more scales"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=int,
+            action="append",
+            help="Number of profiles to seed and benchmark against, e.g. "
+            "--scale 1000 --scale 10000 (default 1000). "
+            "The data is rolled back after each scale.",
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--experiences", type=int, default=10)
+        parser.add_argument("--requests", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--save", help="Write the results to this JSON file")
+        parser.add_argument(
+            "--compare",
+            help="Fail if query counts went up or latencies got slower than "
+            "--tolerance times those in this JSON file from --save",
+        )
+        parser.add_argument("--tolerance", type=float, default=1.5)
+
+    def handle(self, *args, **options):
+        results = {}
+        for scale in options["scale"] or [1000]:
+            with transaction.atomic():
+                seeded = benchmarks.seed(
+                    profiles=scale,
+                    experiences=options["experiences"],
+                    requests=options["requests"],
+                    seed=options["seed"],
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                self.stdout.write(f"Seeded {seeded}")
+                results[str(scale)] = [
+                    asdict(timing)
+                    for timing in benchmarks.benchmark_views(options["iterations"])
+                ]
+                transaction.set_rollback(True)
+            self.stdout.write(f"{'view':>18} {'median ms':>10} {'p95 ms':>10} queries")
+            for timing in results[str(scale)]:
+                self.stdout.write(
+                    f"{timing['view']:>18} {timing['median']:10.1f} "
+                    f"{timing['p95']:10.1f} {timing['queries']:7}"
+                )
+
+        if options["save"]:
+            with open(options["save"], "w") as results_file:
+                json.dump(results, results_file, indent=2)
+        if options["compare"]:
+            with open(options["compare"]) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare(results, baseline, options["tolerance"])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions")
+            self.stdout.write("No regressions")
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Messages for each view of results that makes more queries than in
+    baseline, or whose median latency is over tolerance times the baseline's.
+    """
+    regressions = []
+    for scale, timings in results.items():
+        before = {timing["view"]: timing for timing in baseline.get(scale, [])}
+        for timing in timings:
+            old = before.get(timing["view"])
+            if old is None:
+                continue
+            if timing["queries"] > old["queries"]:
+                regressions.append(
+                    f"{timing['view']} at {scale} profiles: {timing['queries']} "
+                    f"queries, was {old['queries']}"
+                )
+            if timing["median"] > old["median"] * tolerance:
+                regressions.append(
+                    f"{timing['view']} at {scale} profiles: {timing['median']:.1f} ms, "
+                    f"was {old['median']:.1f} ms"
+                )
+    return regressions
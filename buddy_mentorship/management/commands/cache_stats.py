@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from buddy_mentorship.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Shows cache hits and misses per namespace"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Backend: {settings.CACHES['default']['BACKEND']}")
+        stats = get_stats()
+        if not stats:
+            self.stdout.write("No cache lookups recorded")
+        for namespace, counts in sorted(stats.items()):
+            self.stdout.write(
+                f"{namespace}: {counts.hits} hits, {counts.misses} misses "
+                f"({counts.hit_rate:.1%} hit rate)"
+            )
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write("Counters reset")
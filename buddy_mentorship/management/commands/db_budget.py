@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from buddy_mentorship.budget import budget_report, take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the rows of each table and their growth against the plan's row limit"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--exact",
+            action="store_true",
+            help="Count every table instead of using the planner's estimates",
+        )
+        parser.add_argument(
+            "--days", type=int, default=7, help="Days of growth to report"
+        )
+        parser.add_argument(
+            "--save", action="store_true", help="Keep the counts as a snapshot"
+        )
+        parser.add_argument(
+            "--fail-on-warning",
+            action="store_true",
+            help="Exit with an error when close to or over the limit",
+        )
+
+    def handle(self, *args, **options):
+        report = budget_report(exact=options["exact"], days=options["days"])
+        if options["save"]:
+            take_snapshot(report)
+
+        kind = "exact counts" if report.exact else "estimates"
+        self.stdout.write(
+            f"{report.total} of {report.limit} rows ({report.share:.0%}, {kind})"
+        )
+        if report.baseline is not None:
+            self.stdout.write(
+                f"Growth since {report.baseline.taken_at:%Y-%m-%d %H:%M}: "
+                f"{report.growth_per_day:+.1f} rows per day"
+            )
+            if report.days_left is not None:
+                self.stdout.write(f"Limit reached in {report.days_left:.0f} days")
+        for table in report.tables:
+            growth = (
+                f"{table.growth_per_day:+10.1f}/day"
+                if table.growth_per_day is not None
+                else ""
+            )
+            self.stdout.write(f"{table.table:>40} {table.rows:8} {growth}")
+
+        if report.status != "ok":
+            where = "over" if report.status == "over" else "close to"
+            message = f"The database is {where} its row limit"
+            if options["fail_on_warning"]:
+                raise CommandError(message)
+            self.stderr.write(message)
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from buddy_mentorship.imports import (
+    FORMATS,
+    InvalidImport,
+    import_experiences,
+    parse_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports experiences from a CSV or JSON file of email, skill, level, exp_type"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Format of the file, guessed from its extension by default",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only validate the file",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        try:
+            with open(path, encoding="utf-8-sig") as import_file:
+                rows, errors = parse_rows(import_file.read(), format)
+        except (OSError, InvalidImport) as error:
+            raise CommandError(error)
+
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f"{len(errors)} invalid rows, nothing imported")
+        if options["dry_run"]:
+            self.stdout.write(f"{len(rows)} valid rows")
+            return
+        self.stdout.write(str(import_experiences(rows)))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from buddy_mentorship import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the throughput of a running server as a seeded user (see "
+        "seed_benchmark_data) at one or more levels of concurrency, e.g. to "
+        "compare the WSGI and ASGI deployments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="e.g. http://localhost:8000")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            action="append",
+            help="Requests in flight at once, e.g. --concurrency 1 --concurrency 20 "
+            "(default 10)",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per concurrency"
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            help="Path to request, repeat for several (default: skill "
+            "autocomplete, search and profile)",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'concurrency':>11} {'req/s':>8} {'median ms':>10} {'p95 ms':>10} errors"
+        )
+        for concurrency in options["concurrency"] or [10]:
+            result = benchmarks.load_test(
+                options["url"], concurrency, options["requests"], options["path"]
+            )
+            self.stdout.write(
+                f"{result.concurrency:11} {result.throughput:8.1f} "
+                f"{result.median:10.1f} {result.p95:10.1f} {result.errors:6}"
+            )
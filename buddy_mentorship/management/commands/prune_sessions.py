@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from buddy_mentorship.sessions import (
+    BATCH_SIZE,
+    prune_expired_sessions,
+    session_report,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired sessions in small batches and reports how fast the "
+        "session table grows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Seconds to wait between batches",
+        )
+        parser.add_argument(
+            "--report-only",
+            action="store_true",
+            help="Only report the size and growth of the table",
+        )
+        parser.add_argument(
+            "--days", type=int, default=7, help="Days of growth to report"
+        )
+
+    def handle(self, *args, **options):
+        if not options["report_only"]:
+            deleted = prune_expired_sessions(
+                batch_size=options["batch_size"], pause=options["pause"]
+            )
+            self.stdout.write(f"Deleted {deleted} expired sessions")
+
+        report = session_report(days=options["days"])
+        self.stdout.write(f"{report.total} sessions, {report.expired} expired")
+        for day, count in report.started_per_day.items():
+            self.stdout.write(f"  {day}: {count} started")
+        self.stdout.write(
+            f"{report.daily_rate:.1f} sessions started per day, the table should "
+            f"settle around {report.steady_state} rows when pruned"
+        )
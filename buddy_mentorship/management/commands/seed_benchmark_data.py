@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from buddy_mentorship import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates deterministic users, profiles, skills, experiences and buddy "
+        "requests for load testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=1000)
+        parser.add_argument(
+            "--experiences",
+            type=int,
+            default=10,
+            help="Average number of experiences per profile",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2,
+            help="Average number of buddy requests sent per user",
+        )
+        parser.add_argument("--skills", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help=f"Delete previously seeded @{benchmarks.EMAIL_DOMAIN} users first",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["profiles"], options["skills"]) < 1:
+            raise CommandError("--profiles and --skills must be at least 1")
+        if options["clear"]:
+            deleted = benchmarks.clear()
+            self.stdout.write(f"Deleted {deleted} seeded users")
+        result = benchmarks.seed(
+            profiles=options["profiles"],
+            experiences=options["experiences"],
+            requests=options["requests"],
+            skills=options["skills"],
+            seed=options["seed"],
+        )
+        self.stdout.write(f"Seeded {result}")
@@ -0,0 +1,129 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from buddy_mentorship.budget import check_budget
+from buddy_mentorship.metrics import registry
+from buddy_mentorship.models import OutboundEmail
+from buddy_mentorship.outbox import NotificationDispatcher
+from buddy_mentorship.sessions import prune_expired_sessions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Delivers emails waiting in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting once it is drained",
+        )
+        parser.add_argument(
+            "--prune-sessions-every",
+            type=float,
+            default=3600,
+            help="Seconds between deletions of expired sessions while looping, "
+            "0 to never delete them",
+        )
+        parser.add_argument(
+            "--prune-outbox-every",
+            type=float,
+            default=3600,
+            help="Seconds between deletions of emails sent more than "
+            "OUTBOX_RETENTION_DAYS ago while looping, 0 to keep them",
+        )
+        parser.add_argument(
+            "--check-budget-every",
+            type=float,
+            default=86400,
+            help="Seconds between row budget snapshots while looping, 0 to never "
+            "take them",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls when the outbox is empty",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dispatcher = NotificationDispatcher(
+            batch_size=batch_size, max_attempts=options["max_attempts"]
+        )
+        pruned_at = float("-inf")
+        outbox_pruned_at = float("-inf")
+        budget_checked_at = float("-inf")
+        while True:
+            if options["loop"]:
+                # as between requests, drop connections that broke or are too old
+                close_old_connections()
+            prune_every = options["prune_sessions_every"]
+            if (
+                options["loop"]
+                and prune_every
+                and time.monotonic() - pruned_at >= prune_every
+            ):
+                pruned_at = time.monotonic()
+                self.run_task(self.prune_sessions)
+            outbox_every = options["prune_outbox_every"]
+            if (
+                options["loop"]
+                and outbox_every
+                and time.monotonic() - outbox_pruned_at >= outbox_every
+            ):
+                outbox_pruned_at = time.monotonic()
+                self.run_task(self.prune_outbox)
+            budget_every = options["check_budget_every"]
+            if (
+                options["loop"]
+                and budget_every
+                and time.monotonic() - budget_checked_at >= budget_every
+            ):
+                budget_checked_at = time.monotonic()
+                self.run_task(check_budget)
+            stats = dispatcher.dispatch()
+            if stats.sent or stats.failed:
+                self.run_task(registry.publish)
+                self.stdout.write(
+                    f"Delivered {stats.sent} emails ({stats.failed} failed) "
+                    f"over {stats.connections} connections in {stats.seconds:.2f}s, "
+                    f"{stats.messages_per_connection:.1f} emails per connection"
+                )
+            if stats.sent + stats.failed < batch_size:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        # counted in the aggregate file from now on
+        registry.retire()
+        totals = dispatcher.totals
+        self.stdout.write(
+            f"Total: {totals.sent} sent, {totals.failed} failed, "
+            f"{totals.connections} connections, {totals.seconds:.2f}s"
+        )
+
+    def run_task(self, task):
+        """
+        Runs one of the loop's periodic tasks, logging its errors instead of
+        raising them so they can't stop email delivery.
+        """
+        try:
+            task()
+        except Exception:
+            logger.exception("%s failed, retrying on its next run", task.__name__)
+
+    def prune_sessions(self):
+        deleted = prune_expired_sessions(pause=0.1)
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} expired sessions")
+
+    def prune_outbox(self):
+        deleted = OutboundEmail.objects.prune()
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} old emails from the outbox")
@@ -0,0 +1,355 @@
+"""
+Counters and latency histograms, served in the Prometheus text format by the
+metrics view.
+
+    REQUEST_LATENCY.observe(0.12, view="profile")
+    EMAILS.inc(outcome="sent")
+
+Each process keeps its values in memory and writes them to its own file in
+METRICS_DIR at most every FLUSH_INTERVAL seconds; collect() adds up the files
+of every process, so the endpoint reports the totals of all the gunicorn
+workers on a machine whichever one serves it. When a process exits its values
+are added to AGGREGATE_FILE and its file is deleted (retire()), so counters
+don't go backwards and files don't pile up as workers are replaced; the
+directory is emptied when the web server starts.
+
+Processes on other machines, e.g. the email worker's dyno, publish() their
+machine's totals to the database, and collect() adds those too.
+"""
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+# Prometheus' default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_INTERVAL = 1.0
+# the values of processes that have exited, in the format of a process' file
+AGGREGATE_FILE = "aggregate.json"
+
+Labels = Tuple[str, ...]
+
+_lock = threading.Lock()
+
+
+def metrics_dir() -> str:
+    return getattr(settings, "METRICS_DIR", None) or os.path.join(
+        tempfile.gettempdir(), "buddy_mentorship_metrics"
+    )
+
+
+def machine_name() -> str:
+    """
+    The dyno's name on Heroku (e.g. "worker.1"), otherwise the host's
+    """
+    return os.environ.get("DYNO") or socket.gethostname()
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        """
+        name: e.g. "http_requests_total" \n
+        documentation: the HELP line \n
+        labels: names of the labels every sample must be given
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        registry.register(self)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+    def label_values(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format_labels(self, values: Labels, extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labels, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{%s}" % ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.label_values(labels)
+        with _lock:
+            registry.reset_after_fork()
+            self.values[key] = self.values.get(key, 0) + amount
+        registry.maybe_flush()
+
+    def merge(self, total: dict, values):
+        for key, value in values:
+            key = tuple(key)
+            total[key] = total.get(key, 0) + value
+
+    def dump(self) -> list:
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def samples(self, values: dict) -> Iterable[str]:
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{self._format_labels(key)} {_number(value)}"
+
+
+class Histogram(Metric):
+    """
+    Counts observations per bucket (upper bounds in seconds), with their sum.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self.label_values(labels)
+        # counts per bucket, the last one being +Inf, then the sum
+        with _lock:
+            registry.reset_after_fork()
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+        registry.maybe_flush()
+
+    def merge(self, total: dict, values):
+        for key, counts in values:
+            key = tuple(key)
+            if key not in total:
+                total[key] = list(counts)
+            else:
+                total[key] = [a + b for a, b in zip(total[key], counts)]
+
+    def dump(self) -> list:
+        return [[list(key), counts] for key, counts in self.values.items()]
+
+    def samples(self, values: dict) -> Iterable[str]:
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = self._format_labels(key, {"le": _number(bound)})
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = self._format_labels(key)
+            yield f"{self.name}_sum{labels} {_number(counts[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._pid = os.getpid()
+        self._flushed_at = 0.0
+
+    def register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"A metric named {metric.name} already exists")
+        self.metrics[metric.name] = metric
+
+    def reset_after_fork(self):
+        """
+        Drops values inherited from the parent of a forked worker, which
+        are already counted in the parent's file. Call with _lock held.
+        """
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            for metric in self.metrics.values():
+                metric.values = {}
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes this process' values to its file, replacing it atomically so
+        readers never see half a file.
+        """
+        with _lock:
+            self.reset_after_fork()
+            self._flushed_at = time.monotonic()
+            data = {name: metric.dump() for name, metric in self.metrics.items()}
+        _write(os.path.join(metrics_dir(), f"{self._pid}.json"), data)
+
+    def retire(self, pid: Optional[int] = None):
+        """
+        Adds the values of a process that has exited to AGGREGATE_FILE and
+        deletes its file. Without a pid this process' values are moved there,
+        e.g. before a command exits. Only call it from one process at a time,
+        e.g. gunicorn's master.
+        """
+        directory = metrics_dir()
+        if pid is None:
+            with _lock:
+                self.reset_after_fork()
+                data = {name: metric.dump() for name, metric in self.metrics.items()}
+                for metric in self.metrics.values():
+                    metric.values = {}
+            pid = self._pid
+        else:
+            data = _read(os.path.join(directory, f"{pid}.json"))
+            if data is None:
+                return
+        aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        totals = self._merge([_read(aggregate_path), data])
+        _write(aggregate_path, self._dump(totals))
+        try:
+            os.remove(os.path.join(directory, f"{pid}.json"))
+        except FileNotFoundError:
+            pass
+
+    def local_totals(self) -> Dict[str, dict]:
+        """
+        The values of every metric, added up across the files of all processes
+        on this machine
+        """
+        self.flush()
+        directory = metrics_dir()
+        return self._merge(
+            _read(os.path.join(directory, file_name))
+            for file_name in os.listdir(directory)
+            if file_name.endswith(".json")
+        )
+
+    def collect(self) -> Dict[str, dict]:
+        """
+        The values of every metric, added up across the files of all processes
+        on this machine and the totals published by other machines
+        """
+        from .models import MetricsSnapshot
+
+        totals = self.local_totals()
+        published = MetricsSnapshot.objects.exclude(machine=machine_name())
+        return self._merge(
+            [self._dump(totals)] + [snapshot.values for snapshot in published]
+        )
+
+    def publish(self):
+        """
+        Saves this machine's totals to the database for the web server's
+        /metrics, from processes it can't see the files of, e.g. the email
+        worker's dyno.
+        """
+        from .models import MetricsSnapshot
+
+        MetricsSnapshot.objects.update_or_create(
+            machine=machine_name(),
+            defaults={"values": self._dump(self.local_totals())},
+        )
+
+    def _merge(self, dumps: Iterable[Optional[dict]]) -> Dict[str, dict]:
+        totals = {name: {} for name in self.metrics}
+        for data in dumps:
+            for name, values in (data or {}).items():
+                if name in self.metrics:
+                    self.metrics[name].merge(totals[name], values)
+        return totals
+
+    def _dump(self, totals: Dict[str, dict]) -> dict:
+        # the format of a process' file
+        return {
+            name: [[list(key), value] for key, value in values.items()]
+            for name, values in totals.items()
+        }
+
+    def render(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples(values))
+        return "\n".join(lines) + "\n"
+
+    def clear(self, directory: Optional[str] = None):
+        """
+        Deletes the values of every process, e.g. when the web server starts.
+        """
+        with _lock:
+            for metric in self.metrics.values():
+                metric.values = {}
+        directory = directory or metrics_dir()
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith((".json", ".tmp")):
+                    os.remove(os.path.join(directory, file_name))
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: str, data: dict):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, suffix=".tmp", delete=False
+    ) as metrics_file:
+        json.dump(data, metrics_file)
+    os.replace(metrics_file.name, path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests by URL name, method and status code",
+    ["view", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to respond, by URL name", ["view"]
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in SQL queries per request", ["view"]
+)
+REQUEST_QUEUE_TIME = Histogram(
+    "http_request_queue_seconds",
+    "Time between the router receiving a request and a worker starting it",
+)
+DB_QUERIES = Counter("db_queries_total", "SQL queries run, by URL name", ["view"])
+EMAILS = Counter(
+    "emails_total", "Outbound emails by outcome (sent or failed)", ["outcome"]
+)
+EMAIL_LATENCY = Histogram(
+    "email_send_duration_seconds",
+    "Time to hand one email to the mail server, by outcome",
+    ["outcome"],
+)
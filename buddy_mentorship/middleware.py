@@ -0,0 +1,244 @@
+import logging
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+# characters of the slowest statement kept in the log line
+SQL_PREVIEW_LENGTH = 300
+
+
+class QueryRecorder:
+    """
+    A connection.execute_wrapper that counts and times the queries of one
+    request. Statements are compared without their parameters, so the same
+    query run once per row of a list (an N+1) counts as duplicates.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_sql = ""
+        self.slowest_seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            self.statements[sql] += 1
+            if elapsed > self.slowest_seconds:
+                self.slowest_seconds = elapsed
+                self.slowest_sql = sql
+
+    @property
+    def duplicates(self) -> int:
+        """
+        Queries that repeated an earlier statement of the request
+        """
+        return sum(count - 1 for count in self.statements.values())
+
+    @property
+    def most_repeated(self):
+        """
+        The most repeated statement and how many times it ran
+        """
+        if not self.statements:
+            return "", 0
+        return self.statements.most_common(1)[0]
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status, SQL time and query count of every request in
+    the metrics registry, labelled by URL name so that e.g. every profile page
+    shares one series. Requests that match no URL are labelled "unresolved".
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.view_name if match else "") or "unresolved"
+        metrics.REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        metrics.REQUEST_LATENCY.observe(elapsed, view=view)
+        metrics.REQUEST_DB_TIME.observe(timer.seconds, view=view)
+        metrics.DB_QUERIES.inc(timer.count, view=view)
+        return response
+
+
+class QueryTimer:
+    """
+    A connection.execute_wrapper that only counts and times queries, cheap
+    enough to run on every request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the queries of a sample of requests, set by
+    QUERY_INSTRUMENTATION_SAMPLE_RATE (0 to 1), and reports them as a log line
+    of key=value pairs on the buddy_mentorship.middleware logger and as
+    Server-Timing headers, which browsers show in their network panel.
+
+    Requests that aren't sampled only cost a call to random().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, "QUERY_INSTRUMENTATION_SAMPLE_RATE", 0)
+        if not sample_rate or random.random() >= sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} queries"',
+                f"db-duplicates;desc={recorder.duplicates}",
+                f"app;dur={(total - recorder.seconds) * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ]
+        )
+        logger.info(
+            " ".join(
+                f"{key}={value}"
+                for key, value in self.log_fields(
+                    request, response, recorder, total
+                ).items()
+            )
+        )
+        return response
+
+    def log_fields(self, request, response, recorder: QueryRecorder, total: float):
+        repeated_sql, repeated_count = recorder.most_repeated
+        return {
+            "method": request.method,
+            "path": _quote(request.path),
+            "view": _quote(
+                request.resolver_match.view_name if request.resolver_match else ""
+            ),
+            "status": response.status_code,
+            "total_ms": f"{total * 1000:.1f}",
+            "queries": recorder.count,
+            "sql_ms": f"{recorder.seconds * 1000:.1f}",
+            "duplicate_queries": recorder.duplicates,
+            "most_repeated_count": repeated_count,
+            "most_repeated_sql": _quote(repeated_sql if repeated_count > 1 else ""),
+            "slowest_ms": f"{recorder.slowest_seconds * 1000:.1f}",
+            "slowest_sql": _quote(recorder.slowest_sql),
+        }
+
+
+def _quote(value: str) -> str:
+    value = " ".join(value.split())[:SQL_PREVIEW_LENGTH].replace('"', "'")
+    return f'"{value}"'
+
+
+class UserProfileMiddleware:
+    """
+    Replaces the request.user of AuthenticationMiddleware with one loaded
+    together with its profile in a single query, and sets request.profile to
+    that profile (None for anonymous users and users without one). Users
+    without a profile are loaded by their authentication backend as usual.
+
+    Profile lookups during the request share an identity map (see
+    ProfileManager.for_users), so each user's profile is loaded at most once.
+
+    Sessions are checked like django.contrib.auth.get_user does: the backend
+    must still be configured, may refuse the user (e.g. ModelBackend refuses
+    inactive users) and the session hash must match the user's password.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with Profile.objects.request_scope():
+            request.user = SimpleLazyObject(lambda: get_user(request))
+            # not lazy, a lazy None wouldn't be None; every page but the
+            # static ones needs request.user, which loads the profile with it
+            request.profile = Profile.objects.for_user(request.user)
+            return self.get_response(request)
+
+
+def get_user(request):
+    try:
+        user_id = auth.get_user_model()._meta.pk.to_python(
+            request.session[auth.SESSION_KEY]
+        )
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    backend = auth.load_backend(backend_path)
+
+    profile = (
+        Profile.objects.filter(user_id=user_id)
+        .select_related("user", "eligibility")
+        .order_by("id")
+        .first()
+    )
+    if profile is not None:
+        user = profile.user
+    else:
+        user = backend.get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+    if hasattr(backend, "user_can_authenticate") and not (
+        backend.user_can_authenticate(user)
+    ):
+        return AnonymousUser()
+
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (
+        session_hash
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    ):
+        request.session.flush()
+        return AnonymousUser()
+    Profile.objects.remember(user, profile)
+    return user
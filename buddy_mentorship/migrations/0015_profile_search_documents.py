@@ -0,0 +1,159 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+# Profile.can_help_document and Profile.want_help_document hold the text search
+# document used by Search: the user's names, the bio, and the names of the skills
+# the profile can help with or wants help with. The triggers below keep them up to
+# date whenever a Profile, User, Experience or Skill row changes.
+CREATE_TRIGGERS = """
+CREATE FUNCTION buddy_mentorship_profile_document(
+    p_profile_id integer, p_user_id integer, p_bio text, p_exp_type integer
+) RETURNS tsvector AS $$
+    SELECT to_tsvector(concat_ws(
+        ' ',
+        u.first_name,
+        u.last_name,
+        p_bio,
+        (
+            SELECT string_agg(s.skill, ' ')
+            FROM buddy_mentorship_experience e
+            JOIN buddy_mentorship_skill s ON s.id = e.skill_id
+            WHERE e.profile_id = p_profile_id AND e.exp_type = p_exp_type
+        )
+    ))
+    FROM users_user u
+    WHERE u.id = p_user_id
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION buddy_mentorship_refresh_profile_documents(p_profile_id integer)
+RETURNS void AS $$
+    UPDATE buddy_mentorship_profile
+    SET can_help_document = buddy_mentorship_profile_document(id, user_id, bio, 1),
+        want_help_document = buddy_mentorship_profile_document(id, user_id, bio, 0)
+    WHERE id = p_profile_id
+$$ LANGUAGE sql VOLATILE;
+
+CREATE FUNCTION buddy_mentorship_profile_documents_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.can_help_document := buddy_mentorship_profile_document(
+        NEW.id, NEW.user_id, NEW.bio, 1
+    );
+    NEW.want_help_document := buddy_mentorship_profile_document(
+        NEW.id, NEW.user_id, NEW.bio, 0
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER buddy_mentorship_profile_documents
+BEFORE INSERT OR UPDATE OF bio, user_id ON buddy_mentorship_profile
+FOR EACH ROW EXECUTE PROCEDURE buddy_mentorship_profile_documents_trigger();
+
+CREATE FUNCTION buddy_mentorship_experience_documents_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM buddy_mentorship_refresh_profile_documents(NEW.profile_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM buddy_mentorship_refresh_profile_documents(OLD.profile_id);
+    ELSE
+        PERFORM buddy_mentorship_refresh_profile_documents(OLD.profile_id);
+        IF NEW.profile_id <> OLD.profile_id THEN
+            PERFORM buddy_mentorship_refresh_profile_documents(NEW.profile_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER buddy_mentorship_experience_documents
+AFTER INSERT OR UPDATE OF skill_id, exp_type, profile_id OR DELETE
+ON buddy_mentorship_experience
+FOR EACH ROW EXECUTE PROCEDURE buddy_mentorship_experience_documents_trigger();
+
+CREATE FUNCTION buddy_mentorship_user_documents_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM buddy_mentorship_refresh_profile_documents(id)
+    FROM buddy_mentorship_profile
+    WHERE user_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER buddy_mentorship_user_documents
+AFTER UPDATE OF first_name, last_name ON users_user
+FOR EACH ROW
+WHEN (
+    OLD.first_name IS DISTINCT FROM NEW.first_name
+    OR OLD.last_name IS DISTINCT FROM NEW.last_name
+)
+EXECUTE PROCEDURE buddy_mentorship_user_documents_trigger();
+
+CREATE FUNCTION buddy_mentorship_skill_documents_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM buddy_mentorship_refresh_profile_documents(affected.profile_id)
+    FROM (
+        SELECT DISTINCT profile_id
+        FROM buddy_mentorship_experience
+        WHERE skill_id = NEW.id
+    ) AS affected;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER buddy_mentorship_skill_documents
+AFTER UPDATE OF skill ON buddy_mentorship_skill
+FOR EACH ROW
+WHEN (OLD.skill IS DISTINCT FROM NEW.skill)
+EXECUTE PROCEDURE buddy_mentorship_skill_documents_trigger();
+
+UPDATE buddy_mentorship_profile
+SET can_help_document = buddy_mentorship_profile_document(id, user_id, bio, 1),
+    want_help_document = buddy_mentorship_profile_document(id, user_id, bio, 0);
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER buddy_mentorship_skill_documents ON buddy_mentorship_skill;
+DROP FUNCTION buddy_mentorship_skill_documents_trigger();
+DROP TRIGGER buddy_mentorship_user_documents ON users_user;
+DROP FUNCTION buddy_mentorship_user_documents_trigger();
+DROP TRIGGER buddy_mentorship_experience_documents ON buddy_mentorship_experience;
+DROP FUNCTION buddy_mentorship_experience_documents_trigger();
+DROP TRIGGER buddy_mentorship_profile_documents ON buddy_mentorship_profile;
+DROP FUNCTION buddy_mentorship_profile_documents_trigger();
+DROP FUNCTION buddy_mentorship_refresh_profile_documents(integer);
+DROP FUNCTION buddy_mentorship_profile_document(integer, integer, text, integer);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buddy_mentorship', '0014_outboundemail'),
+        ('users', '0005_auto_20200627_2027'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='can_help_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='want_help_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['can_help_document'], name='profile_can_help_doc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['want_help_document'], name='profile_want_help_doc_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Django runs icontains/istartswith as UPPER("skill"::text) LIKE UPPER(%s),
+# so the trigram index has to be on that expression to be usable.
+CREATE_INDEX = """
+CREATE INDEX skill_skill_upper_trgm_idx
+ON buddy_mentorship_skill
+USING gin ((UPPER("skill"::text)) gin_trgm_ops);
+"""
+
+DROP_INDEX = "DROP INDEX skill_skill_upper_trgm_idx;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buddy_mentorship", "0015_profile_search_documents"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
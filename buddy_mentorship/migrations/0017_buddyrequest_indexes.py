@@ -0,0 +1,34 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('buddy_mentorship', '0016_skill_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='buddyrequest',
+            index=models.Index(fields=['requestor', 'requestee', 'request_type'], name='buddyrequest_pair_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='buddyrequest',
+            index=models.Index(condition=models.Q(('status', 2), _negated=True), fields=['requestor', 'request_type', '-id'], name='buddyrequest_sent_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='buddyrequest',
+            index=models.Index(condition=models.Q(('status', 2), _negated=True), fields=['requestee', 'request_type', '-id'], name='buddyrequest_received_open_idx'),
+        ),
+        # replaced by buddyrequest_pair_idx, dropped once that exists
+        migrations.AlterField(
+            model_name='buddyrequest',
+            name='requestor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='requestor', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL = """
+INSERT INTO buddy_mentorship_profileeligibility (
+    profile_id,
+    has_can_help,
+    has_want_help,
+    looking_for_mentors,
+    looking_for_mentees,
+    is_active
+)
+SELECT
+    profile.id,
+    EXISTS (
+        SELECT 1 FROM buddy_mentorship_experience
+        WHERE profile_id = profile.id AND exp_type = 1
+    ),
+    EXISTS (
+        SELECT 1 FROM buddy_mentorship_experience
+        WHERE profile_id = profile.id AND exp_type = 0
+    ),
+    profile.looking_for_mentors,
+    profile.looking_for_mentees,
+    users_user.is_active
+FROM buddy_mentorship_profile AS profile
+JOIN users_user ON users_user.id = profile.user_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buddy_mentorship', '0017_buddyrequest_indexes'),
+        ('users', '0005_auto_20200627_2027'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileEligibility',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='eligibility', serialize=False, to='buddy_mentorship.profile')),
+                ('has_can_help', models.BooleanField(default=False)),
+                ('has_want_help', models.BooleanField(default=False)),
+                ('looking_for_mentors', models.BooleanField(default=False)),
+                ('looking_for_mentees', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='profileeligibility',
+            index=models.Index(condition=models.Q(('has_can_help', True), ('is_active', True), ('looking_for_mentees', True)), fields=['profile'], name='eligible_mentor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileeligibility',
+            index=models.Index(condition=models.Q(('has_want_help', True), ('is_active', True), ('looking_for_mentors', True)), fields=['profile'], name='eligible_mentee_idx'),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buddy_mentorship', '0018_profileeligibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableSizeSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('exact', models.BooleanField(default=False)),
+                ('rows', models.JSONField()),
+            ],
+            options={
+                'get_latest_by': 'taken_at',
+            },
+        ),
+    ]
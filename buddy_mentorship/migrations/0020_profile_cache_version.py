@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buddy_mentorship', '0019_tablesizesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buddy_mentorship', '0020_profile_cache_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('machine', models.CharField(max_length=255, unique=True)),
+                ('values', models.JSONField()),
+                ('published_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
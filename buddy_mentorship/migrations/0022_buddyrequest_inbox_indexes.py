@@ -0,0 +1,29 @@
+# Generated by Django 3.2.23 on 2026-10-17 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buddy_mentorship', '0021_metricssnapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='buddyrequest',
+            name='buddyrequest_sent_open_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='buddyrequest',
+            name='buddyrequest_received_open_idx',
+        ),
+        migrations.AddIndex(
+            model_name='buddyrequest',
+            index=models.Index(condition=models.Q(('status', 2), _negated=True), fields=['requestor', '-id'], name='buddyrequest_sent_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='buddyrequest',
+            index=models.Index(condition=models.Q(('status', 2), _negated=True), fields=['requestee', '-id'], name='buddyrequest_received_open_idx'),
+        ),
+    ]
@@ -1,13 +1,24 @@
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.db import models
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.html import strip_tags
 from apps.users.models import User
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+)
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -19,6 +30,20 @@ class BuddyRequestManager(models.Manager):
             requestor=requestor, requestee=requestee, request_type=request_type
         ).first()
 
+    def inbox(self, user: User):
+        """
+        Requests and offers sent or received by user, except rejected ones,
+        newest first and with both users selected.
+        Served by buddyrequest_sent_open_idx and buddyrequest_received_open_idx,
+        one for each side of the OR.
+        """
+        return (
+            self.filter(models.Q(requestor=user) | models.Q(requestee=user))
+            .exclude(status=BuddyRequest.Status.REJECTED)
+            .select_related("requestor", "requestee")
+            .order_by("-id")
+        )
+
 
 class BuddyRequest(models.Model):
     class Status(models.IntegerChoices):
@@ -37,12 +62,33 @@ class BuddyRequest(models.Model):
     requestee = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="requestee"
     )
+    # indexed as the leading column of buddyrequest_pair_idx
     requestor = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="requestor"
+        User, on_delete=models.CASCADE, related_name="requestor", db_index=False
     )
     message = models.TextField()
     objects = BuddyRequestManager()
 
+    class Meta:
+        indexes = [
+            # find_by_users, existing_requests and RelationshipState
+            models.Index(
+                fields=["requestor", "requestee", "request_type"],
+                name="buddyrequest_pair_idx",
+            ),
+            # inbox(), which never shows rejected requests (status 2)
+            models.Index(
+                fields=["requestor", "-id"],
+                name="buddyrequest_sent_open_idx",
+                condition=~models.Q(status=2),
+            ),
+            models.Index(
+                fields=["requestee", "-id"],
+                name="buddyrequest_received_open_idx",
+                condition=~models.Q(status=2),
+            ),
+        ]
+
     def __str__(self):
         request_type_str = ["Request", "Offer"][int(self.request_type)]
         return (
@@ -55,8 +101,9 @@ class BuddyRequest(models.Model):
         super().save(*args, **kwargs)
 
         request_type_str = ["Request", "Offer"][int(self.request_type)]
-        requestor_profile = Profile.objects.get(user=self.requestor)
-        requestee_profile = Profile.objects.get(user=self.requestee)
+        profiles = Profile.objects.for_users([self.requestor, self.requestee])
+        requestor_profile = profiles[self.requestor.id]
+        requestee_profile = profiles[self.requestee.id]
 
         def email_context(self):
             return {
@@ -78,64 +125,135 @@ class BuddyRequest(models.Model):
             html_message = render_to_string(
                 "buddy_mentorship/email/new_request.html", context=email_context(self)
             )
-            plain_message = strip_tags(html_message)
-
-            send_mail(
+            OutboundEmail.objects.queue(
                 f"New ChiPy Mentorship {request_type_str}!",
-                plain_message,
-                settings.EMAIL_ADDRESS,
-                [self.requestee.email],
-                html_message=html_message,
+                html_message,
+                self.requestee.email,
             )
 
         elif self.status == 1:
-            requestee_profile_url = reverse("profile", args=[requestee_profile.id])
             html_message = render_to_string(
                 "buddy_mentorship/email/request_accepted.html",
                 context=email_context(self),
             )
-            plain_message = strip_tags(html_message)
-            send_mail(
+            OutboundEmail.objects.queue(
                 f"ChiPy Mentorship {request_type_str} Accepted!",
-                plain_message,
-                settings.EMAIL_ADDRESS,
-                [self.requestor.email],
-                html_message=html_message,
+                html_message,
+                self.requestor.email,
             )
 
         elif self.status == 2:
             pass
 
         elif self.status == 3:
-            requestor_profile_url = reverse("profile", args=[requestor_profile.id])
             requestee_html_message = render_to_string(
                 "buddy_mentorship/email/requestee_mentorship_completed.html",
                 context=email_context(self),
             )
-            requestee_plain_message = strip_tags(requestee_html_message)
-            send_mail(
+            OutboundEmail.objects.queue(
                 f"ChiPy Mentorship Completed",
-                requestee_plain_message,
-                settings.EMAIL_ADDRESS,
-                [self.requestee.email],
-                html_message=requestee_html_message,
+                requestee_html_message,
+                self.requestee.email,
             )
 
-            requestee_profile_url = reverse("profile", args=[requestee_profile.id])
             requestor_html_message = render_to_string(
                 "buddy_mentorship/email/requestor_mentorship_completed.html",
                 context=email_context(self),
             )
-            requestor_plain_message = strip_tags(requestor_html_message)
-            send_mail(
+            OutboundEmail.objects.queue(
                 f"ChiPy Mentorship Completed",
-                requestor_plain_message,
-                settings.EMAIL_ADDRESS,
-                [self.requestor.email],
-                html_message=requestor_html_message,
+                requestor_html_message,
+                self.requestor.email,
             )
 
 
+# the profiles looked up during the current request by user id, None outside of
+# requests; see ProfileManager.request_scope
+_request_profiles: ContextVar[Optional[dict]] = ContextVar(
+    "request_profiles", default=None
+)
+
+
+class ProfileManager(models.Manager):
+    def for_user(self, user: User) -> "Optional[Profile]":
+        """
+        The user's (first) profile with its eligibility, or None.
+        """
+        if not user.is_authenticated:
+            return None
+        return self.for_users([user])[user.id]
+
+    def for_users(self, users: Iterable[User]) -> "Dict[int, Optional[Profile]]":
+        """
+        The (first) profile of each user by user id, or None for users without
+        one, with their eligibility. During a request profiles are memoized in
+        an identity map shared by every lookup of the request, so each user's
+        profile is loaded at most once per request. Outside of requests nothing
+        is memoized, so a profile that changed is never stale.
+        """
+        profiles = {}
+        request_profiles = _request_profiles.get()
+        missing = []
+        for user in users:
+            if request_profiles is not None and user.id in request_profiles:
+                profiles[user.id] = request_profiles[user.id]
+            else:
+                missing.append(user)
+        if missing:
+            found = {}
+            for profile in (
+                self.filter(user__in=missing)
+                .select_related("eligibility")
+                .order_by("-id")
+            ):
+                found[profile.user_id] = profile
+            for user in missing:
+                profile = found.get(user.id)
+                if profile is not None:
+                    profile.user = user
+                self.remember(user, profile)
+                profiles[user.id] = profile
+        return profiles
+
+    def remember(self, user: User, profile: "Optional[Profile]"):
+        """
+        Memoizes profile (or None) as user's for the rest of the request, e.g.
+        when it was loaded with the user.
+        """
+        request_profiles = _request_profiles.get()
+        if request_profiles is not None:
+            request_profiles[user.id] = profile
+
+    def forget(self, profile: "Profile"):
+        """
+        Drops the memoized profile of profile's user, after it changed.
+        """
+        request_profiles = _request_profiles.get()
+        if request_profiles is not None:
+            request_profiles.pop(profile.user_id, None)
+
+    def touch(self, profile_ids):
+        """
+        Changes the cache_stamp of the profiles, e.g. after one of their
+        experiences changed. profile_ids may be a queryset of ids.
+        """
+        self.filter(id__in=profile_ids).update(
+            cache_version=models.F("cache_version") + 1
+        )
+
+    @contextmanager
+    def request_scope(self):
+        """
+        Shares profile lookups between everything that runs within it,
+        see UserProfileMiddleware.
+        """
+        token = _request_profiles.set({})
+        try:
+            yield
+        finally:
+            _request_profiles.reset(token)
+
+
 class Profile(models.Model):
     """
     A model for storing user profile information
@@ -145,10 +263,32 @@ class Profile(models.Model):
     bio = models.TextField(null=True, blank=True)
     looking_for_mentors = models.BooleanField(null=False, default=True)
     looking_for_mentees = models.BooleanField(null=False, default=True)
+    # maintained by database triggers, see migration 0015_profile_search_documents
+    can_help_document = SearchVectorField(null=True, editable=False)
+    want_help_document = SearchVectorField(null=True, editable=False)
+    # bumped whenever the profile, its experiences or their skills change, see
+    # cache_stamp; kept in the database so every process sees the same one
+    cache_version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProfileManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["can_help_document"], name="profile_can_help_doc_idx"),
+            GinIndex(fields=["want_help_document"], name="profile_want_help_doc_idx"),
+        ]
 
     def __str__(self):
         return f"Profile for {self.user.email}"
 
+    @property
+    def cache_stamp(self) -> str:
+        """
+        Changes whenever the profile, its experiences or their skills are saved;
+        cached fragments of the profile page vary on it.
+        """
+        return str(self.cache_version)
+
     def get_short_bio(self):
         trunc_bio = self.bio[:240]
         first_nl = trunc_bio.find("\n")
@@ -165,9 +305,11 @@ class Profile(models.Model):
         return trunc_bio[: trunc_bio.rfind(" ") + 1]
 
     def get_can_help(self, query=""):
-        results = Experience.objects.filter(
-            profile=self, exp_type=Experience.Type.CAN_HELP
-        ).order_by("-level")
+        results = (
+            Experience.objects.filter(profile=self, exp_type=Experience.Type.CAN_HELP)
+            .select_related("skill")
+            .order_by("-level")
+        )
         if query:
             vector = SearchVector("skill__skill")
             or_query = SearchQuery(query.replace(" ", " | "), search_type="raw")
@@ -176,9 +318,11 @@ class Profile(models.Model):
         return results
 
     def get_help_wanted(self, query=""):
-        results = Experience.objects.filter(
-            profile=self, exp_type=Experience.Type.WANT_HELP
-        ).order_by("level")
+        results = (
+            Experience.objects.filter(profile=self, exp_type=Experience.Type.WANT_HELP)
+            .select_related("skill")
+            .order_by("level")
+        )
         if query:
             vector = SearchVector("skill__skill")
             results = results.annotate(rank=SearchRank(vector, query))
@@ -192,6 +336,29 @@ class Profile(models.Model):
         return self.get_help_wanted(query)[:3]
 
 
+class SkillManager(models.Manager):
+    def autocomplete(self, term: str, limit: int = 10):
+        """
+        Skills containing term, those starting with it first, then the most
+        popular (by number of experiences). Served by the trigram index on
+        UPPER(skill) created in migration 0016_skill_trigram_index.
+        """
+        if not term:
+            return self.none()
+        return (
+            self.filter(skill__icontains=term)
+            .annotate(
+                prefix_match=models.Case(
+                    models.When(skill__istartswith=term, then=models.Value(True)),
+                    default=models.Value(False),
+                    output_field=models.BooleanField(),
+                ),
+                popularity=models.Count("experience"),
+            )
+            .order_by("-prefix_match", "-popularity", "id")[:limit]
+        )
+
+
 class Skill(models.Model):
     """
     skill: lowercased name of skill (e.g. "python", "mvc", etc.). Must be unique.\n
@@ -200,6 +367,7 @@ class Skill(models.Model):
 
     skill = models.CharField(max_length=50, unique=True)
     display_name = models.CharField(max_length=50, null=True)
+    objects = SkillManager()
 
     def save(self, *args, **kwargs):
         if not self.pk:
@@ -233,3 +401,243 @@ class Experience(models.Model):
 
     def __str__(self):
         return f"{self.profile.user.email} {self.skill}"
+
+
+class ProfileEligibility(models.Model):
+    """
+    Whether a profile can take part in mentorships, kept up to date from
+    Profile, Experience and User by the receivers in signals.py so checks and
+    search don't have to look through experiences.
+
+    has_can_help / has_want_help: the profile has an experience of that type \n
+    looking_for_mentors / looking_for_mentees: copied from the profile \n
+    is_active: copied from the profile's user
+    """
+
+    profile = models.OneToOneField(
+        Profile, on_delete=models.CASCADE, primary_key=True, related_name="eligibility"
+    )
+    has_can_help = models.BooleanField(default=False)
+    has_want_help = models.BooleanField(default=False)
+    looking_for_mentors = models.BooleanField(default=False)
+    looking_for_mentees = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # mentor and mentee search
+            models.Index(
+                fields=["profile"],
+                name="eligible_mentor_idx",
+                condition=models.Q(
+                    has_can_help=True, looking_for_mentees=True, is_active=True
+                ),
+            ),
+            models.Index(
+                fields=["profile"],
+                name="eligible_mentee_idx",
+                condition=models.Q(
+                    has_want_help=True, looking_for_mentors=True, is_active=True
+                ),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Eligibility of profile {self.profile_id}"
+
+    @classmethod
+    def refresh(cls, profile: Profile) -> "ProfileEligibility":
+        """
+        Recomputes every field for profile, creating its record if needed.
+        """
+        experiences = Experience.objects.filter(profile=profile)
+        eligibility, created = cls.objects.update_or_create(
+            profile=profile,
+            defaults={
+                "has_can_help": experiences.filter(
+                    exp_type=Experience.Type.CAN_HELP
+                ).exists(),
+                "has_want_help": experiences.filter(
+                    exp_type=Experience.Type.WANT_HELP
+                ).exists(),
+                "looking_for_mentors": profile.looking_for_mentors,
+                "looking_for_mentees": profile.looking_for_mentees,
+                "is_active": profile.user.is_active,
+            },
+        )
+        return eligibility
+
+    @classmethod
+    def refresh_experiences(cls, profile_ids):
+        """
+        Recomputes has_can_help and has_want_help for profile_ids, in one query.
+        Only updates existing records, so it is safe while a profile is being
+        deleted.
+        """
+        experiences = Experience.objects.filter(
+            profile_id=models.OuterRef("profile_id")
+        )
+        cls.objects.filter(profile_id__in=profile_ids).update(
+            has_can_help=models.Exists(
+                experiences.filter(exp_type=Experience.Type.CAN_HELP)
+            ),
+            has_want_help=models.Exists(
+                experiences.filter(exp_type=Experience.Type.WANT_HELP)
+            ),
+        )
+
+    @classmethod
+    def of(cls, profiles) -> dict:
+        """
+        The records of profiles by profile id, using those already loaded
+        (e.g. with select_related("eligibility")) and fetching the rest in
+        one query. Profiles without a record get an unsaved, all False one.
+        """
+        records = {}
+        missing = []
+        for profile in profiles:
+            if Profile.eligibility.is_cached(profile):
+                try:
+                    records[profile.id] = profile.eligibility
+                    continue
+                except cls.DoesNotExist:
+                    pass
+            missing.append(profile.id)
+        if missing:
+            for eligibility in cls.objects.filter(profile_id__in=missing):
+                records[eligibility.profile_id] = eligibility
+        for profile_id in missing:
+            records.setdefault(profile_id, cls(profile_id=profile_id))
+        return records
+
+
+class OutboundEmailManager(models.Manager):
+    def queue(self, subject: str, html_message: str, recipient: str):
+        """
+        Adds an email to the outbox. The plain text body is derived from the html.
+        """
+        return self.create(
+            subject=subject,
+            body=strip_tags(html_message),
+            html_body=html_message,
+            from_email=settings.EMAIL_ADDRESS,
+            recipient=recipient,
+        )
+
+    def due(self):
+        return self.filter(
+            status=OutboundEmail.Status.QUEUED, send_after__lte=timezone.now()
+        ).order_by("id")
+
+    def prune(self, days: Optional[int] = None) -> int:
+        """
+        Deletes emails sent, or given up on, more than days ago
+        (OUTBOX_RETENTION_DAYS by default). Returns how many were deleted.
+        """
+        if days is None:
+            days = settings.OUTBOX_RETENTION_DAYS
+        cutoff = timezone.now() - timedelta(days=days)
+        deleted, _ = self.filter(
+            models.Q(status=OutboundEmail.Status.SENT, sent_at__lt=cutoff)
+            | models.Q(status=OutboundEmail.Status.FAILED, send_after__lt=cutoff)
+        ).delete()
+        return deleted
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be delivered by the send_queued_email command
+    """
+
+    class Status(models.IntegerChoices):
+        QUEUED = 0
+        SENT = 1
+        FAILED = 2
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, null=True)
+    recipient = models.EmailField()
+    status = models.IntegerField(choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    send_after = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    objects = OutboundEmailManager()
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient}"
+
+    def as_message(self, connection=None):
+        message = EmailMultiAlternatives(
+            self.subject,
+            self.body,
+            self.from_email,
+            [self.recipient],
+            connection=connection,
+        )
+        if self.html_body:
+            message.attach_alternative(self.html_body, "text/html")
+        return message
+
+    def mark_sent(self):
+        self.status = OutboundEmail.Status.SENT
+        self.attempts += 1
+        self.sent_at = timezone.now()
+        self.save()
+
+    def mark_failed(self, error, max_attempts: int):
+        """
+        Records a failed delivery and schedules a retry with exponential backoff,
+        or gives up once max_attempts is reached.
+        """
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.status = OutboundEmail.Status.FAILED
+        else:
+            self.send_after = timezone.now() + timedelta(minutes=2**self.attempts)
+        self.save()
+
+
+class TableSizeSnapshot(models.Model):
+    """
+    The number of rows in every table at one time, kept to measure growth;
+    see budget.py and the db_budget command.
+
+    rows: table name -> number of rows \n
+    exact: whether rows are exact counts rather than the planner's estimates
+    """
+
+    taken_at = models.DateTimeField(default=timezone.now, db_index=True)
+    exact = models.BooleanField(default=False)
+    rows = models.JSONField()
+
+    class Meta:
+        get_latest_by = "taken_at"
+
+    def __str__(self):
+        return f"{self.total} rows on {self.taken_at:%Y-%m-%d %H:%M}"
+
+    @property
+    def total(self) -> int:
+        return sum(self.rows.values())
+
+
+class MetricsSnapshot(models.Model):
+    """
+    The metrics totals of one machine, published by processes whose files the
+    web server can't read, e.g. the email worker's dyno; see metrics.py.
+
+    machine: the dyno or host name \n
+    values: metric name -> values, in the format of a process' metrics file
+    """
+
+    machine = models.CharField(max_length=255, unique=True)
+    values = models.JSONField()
+    published_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.machine} on {self.published_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,163 @@
+import json
+from typing import List, Optional, Sequence
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+
+COUNT_MODES = [None, "exact", "approximate"]
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator, with the parts of Django's Page that
+    don't need a count.
+    """
+
+    def __init__(
+        self,
+        object_list: List,
+        paginator: "KeysetPaginator",
+        next_cursor: Optional[str] = None,
+        previous_cursor: Optional[str] = None,
+    ):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset in descending order of keys (e.g. ["rank", "id"],
+    the last of which must be unique) by filtering on the keys of the row a
+    page starts after, instead of an OFFSET, so every page costs the same.
+
+    Pages are addressed by opaque cursors signed with salt; a cursor made for
+    another salt (e.g. another search) or tampered with gives the first page.
+    There's no page count; count_mode can be "exact" (a COUNT query) or
+    "approximate" (the planner's estimate, from EXPLAIN) to get a total.
+    """
+
+    def __init__(
+        self,
+        queryset,
+        keys: Sequence[str],
+        per_page: int,
+        salt: str = "",
+        count_mode: Optional[str] = None,
+    ):
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"count_mode must be one of {COUNT_MODES}")
+        self.queryset = queryset
+        self.keys = list(keys)
+        self.per_page = per_page
+        self.salt = f"keyset:{salt}"
+        self.count_mode = count_mode
+        self._count = None
+
+    @property
+    def count(self) -> Optional[int]:
+        if self._count is None and self.count_mode == "exact":
+            self._count = self.queryset.count()
+        elif self._count is None and self.count_mode == "approximate":
+            self._count = estimate_count(self.queryset)
+        return self._count
+
+    @property
+    def count_is_approximate(self) -> bool:
+        return self.count_mode == "approximate"
+
+    @property
+    def last_cursor(self) -> str:
+        return self._encode("last")
+
+    def page(self, cursor: Optional[str] = None) -> KeysetPage:
+        """
+        The page cursor points to, the first page if cursor is empty or invalid
+        """
+        direction, values = self._decode(cursor) if cursor else ("first", None)
+        backwards = direction in ["before", "last"]
+
+        if backwards:
+            queryset = self.queryset.order_by(*self.keys)
+        else:
+            queryset = self.queryset.order_by(*[f"-{key}" for key in self.keys])
+        if values is not None:
+            queryset = queryset.filter(self._past(values, backwards))
+        rows = list(queryset[: self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        # the row a cursor was made from is on the other side of it
+        has_next = more if not backwards else direction == "before"
+        has_previous = more if backwards else direction == "after"
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=self._encode("after", rows[-1]) if rows and has_next else None,
+            previous_cursor=(
+                self._encode("before", rows[0]) if rows and has_previous else None
+            ),
+        )
+
+    def _past(self, values, backwards: bool) -> Q:
+        """
+        Rows past values in the page's direction:
+        (k1 < v1) or (k1 = v1 and k2 < v2) or ... going forwards.
+        """
+        lookup = "gt" if backwards else "lt"
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            equal = {self.keys[j]: values[j] for j in range(i)}
+            condition |= Q(**equal, **{f"{key}__{lookup}": values[i]})
+        return condition
+
+    def _encode(self, direction: str, row=None) -> str:
+        values = [getattr(row, key) for key in self.keys] if row is not None else None
+        return signing.dumps([direction, values], salt=self.salt)
+
+    def _decode(self, cursor: str):
+        try:
+            direction, values = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            return "first", None
+        if direction not in ["after", "before", "last"] or (
+            direction != "last" and len(values or []) != len(self.keys)
+        ):
+            return "first", None
+        return direction, values
+
+
+def estimate_count(queryset) -> int:
+    """
+    The number of rows postgres' planner expects queryset to return,
+    without running it.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,171 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db.models import Q
+
+from apps.users.models import User
+
+from .models import BuddyRequest, Profile, ProfileEligibility
+
+# (sent by viewer, request type) -> RelationshipState attribute
+_REQUEST_SLOTS = {
+    (True, BuddyRequest.RequestType.REQUEST): "request_from_viewer",
+    (True, BuddyRequest.RequestType.OFFER): "offer_from_viewer",
+    (False, BuddyRequest.RequestType.REQUEST): "request_to_viewer",
+    (False, BuddyRequest.RequestType.OFFER): "offer_to_viewer",
+}
+
+
+@dataclass
+class RelationshipState:
+    """
+    How viewer and other relate to each other: the requests and offers sent
+    either way and whether each of them can help or wants help.
+
+    Use load() or between() to build one; both run at most two queries,
+    and every property after that is answered from memory.
+    """
+
+    viewer: User
+    other: User
+    viewer_profile: Optional[Profile]
+    profile: Optional[Profile]
+    request_from_viewer: Optional[BuddyRequest] = None
+    offer_from_viewer: Optional[BuddyRequest] = None
+    request_to_viewer: Optional[BuddyRequest] = None
+    offer_to_viewer: Optional[BuddyRequest] = None
+    viewer_can_help: bool = False
+    viewer_wants_help: bool = False
+    other_can_help: bool = False
+    other_wants_help: bool = False
+
+    @classmethod
+    def load(
+        cls, viewer: User, viewer_profile: Optional[Profile], profile: Profile
+    ) -> "RelationshipState":
+        """
+        viewer: the logged in user \n
+        viewer_profile: viewer's profile, if they have one \n
+        profile: the profile being looked at, ideally with its user already selected \n
+        Selecting both profiles' eligibility too saves a query.
+        """
+        state = cls(
+            viewer=viewer,
+            other=profile.user,
+            viewer_profile=viewer_profile,
+            profile=profile,
+        )
+        if viewer_profile is None or viewer_profile == profile:
+            return state
+
+        eligibility = ProfileEligibility.of([viewer_profile, profile])
+        viewer_eligibility = eligibility[viewer_profile.id]
+        state.viewer_can_help = viewer_eligibility.has_can_help
+        state.viewer_wants_help = viewer_eligibility.has_want_help
+        other_eligibility = eligibility[profile.id]
+        state.other_can_help = other_eligibility.has_can_help
+        state.other_wants_help = other_eligibility.has_want_help
+
+        exchanged = BuddyRequest.objects.filter(
+            Q(requestor=viewer, requestee_id=profile.user_id)
+            | Q(requestor_id=profile.user_id, requestee=viewer)
+        ).order_by("id")
+        for buddy_request in exchanged:
+            slot = _REQUEST_SLOTS[
+                (buddy_request.requestor_id == viewer.id, buddy_request.request_type)
+            ]
+            if getattr(state, slot) is None:
+                setattr(state, slot, buddy_request)
+        return state
+
+    @classmethod
+    def between(cls, viewer: User, other: User) -> "RelationshipState":
+        """
+        Like load(), for callers that only have the two users.
+        """
+        profiles = Profile.objects.for_users([viewer, other])
+        profile = profiles.get(other.id)
+        if profile is None:
+            return cls(
+                viewer=viewer,
+                other=other,
+                viewer_profile=profiles.get(viewer.id),
+                profile=None,
+            )
+        return cls.load(viewer, profiles.get(viewer.id), profile)
+
+    @property
+    def has_profiles(self) -> bool:
+        return self.viewer_profile is not None and self.profile is not None
+
+    @property
+    def can_request(self) -> bool:
+        """
+        Whether viewer can ask other to be their mentor
+        """
+        return bool(
+            self.has_profiles
+            and self.viewer.id != self.other.id
+            and self.viewer.is_active
+            and self.other.is_active
+            and self.viewer_wants_help
+            and self.other_can_help
+            and self.profile.looking_for_mentees
+            and not (self.request_from_viewer or self.offer_to_viewer)
+        )
+
+    @property
+    def can_offer(self) -> bool:
+        """
+        Whether viewer can offer to mentor other
+        """
+        return bool(
+            self.has_profiles
+            and self.viewer.id != self.other.id
+            and self.viewer.is_active
+            and self.other.is_active
+            and self.other_wants_help
+            and self.viewer_can_help
+            and self.profile.looking_for_mentors
+            and not (self.request_to_viewer or self.offer_from_viewer)
+        )
+
+    @property
+    def request_pending(self) -> bool:
+        return bool(self.request_from_viewer or self.offer_to_viewer)
+
+    @property
+    def offer_pending(self) -> bool:
+        return bool(self.request_to_viewer or self.offer_from_viewer)
+
+    @property
+    def cannot_request_not_looking(self) -> bool:
+        return (
+            not self.can_request
+            and not self.request_pending
+            and not self.profile.looking_for_mentees
+        )
+
+    @property
+    def cannot_offer_not_looking(self) -> bool:
+        return (
+            not self.can_offer
+            and not self.offer_pending
+            and not self.profile.looking_for_mentors
+        )
+
+    @property
+    def cannot_request_no_skills(self) -> bool:
+        return (
+            not self.can_request
+            and not self.request_pending
+            and self.profile.looking_for_mentees
+        )
+
+    @property
+    def cannot_offer_no_skills(self) -> bool:
+        return (
+            not self.can_offer
+            and not self.offer_pending
+            and self.profile.looking_for_mentors
+        )
@@ -0,0 +1,104 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Case, F, FloatField, IntegerField, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from .models import Experience, Skill
+
+
+def top_experiences(profile_ids, query_text: str = "", limit: int = 3):
+    """
+    Fetches the top `limit` experiences of each type for every profile in
+    profile_ids in a single windowed query, skills included.
+
+    The ranking matches Profile.get_can_help and Profile.get_help_wanted:
+    by level (highest first for can help, lowest first for want help),
+    or by search rank against query_text when one is given.
+    Results are ordered by profile, type and rank.
+    """
+    can_help = Experience.Type.CAN_HELP
+    if query_text:
+        vector = SearchVector("skill__skill")
+        or_query = SearchQuery(query_text.replace(" ", " | "), search_type="raw")
+        order_by = [
+            Case(
+                When(exp_type=can_help, then=SearchRank(vector, or_query)),
+                default=SearchRank(vector, SearchQuery(query_text)),
+                output_field=FloatField(),
+            ).desc()
+        ]
+    else:
+        order_by = [
+            Case(
+                When(exp_type=can_help, then=F("level")),
+                default=Value(0),
+                output_field=IntegerField(),
+            ).desc(),
+            Case(
+                When(exp_type=can_help, then=Value(0)),
+                default=F("level"),
+                output_field=IntegerField(),
+            ).asc(),
+        ]
+    ranked = (
+        Experience.objects.filter(profile_id__in=profile_ids)
+        .annotate(
+            skill_name=F("skill__skill"),
+            skill_display_name=F("skill__display_name"),
+            position=Window(
+                RowNumber(),
+                partition_by=[F("profile_id"), F("exp_type")],
+                order_by=order_by + [F("id").asc()],
+            ),
+        )
+        .values(
+            "id",
+            "profile_id",
+            "skill_id",
+            "level",
+            "exp_type",
+            "skill_name",
+            "skill_display_name",
+            "position",
+        )
+    )
+    sql, params = ranked.query.sql_with_params()
+    experiences = Experience.objects.raw(
+        f"SELECT * FROM ({sql}) AS ranked WHERE position <= %s "
+        "ORDER BY profile_id, exp_type, position",
+        (*params, limit),
+    )
+    for experience in experiences:
+        experience.skill = Skill(
+            id=experience.skill_id,
+            skill=experience.skill_name,
+            display_name=experience.skill_display_name,
+        )
+        yield experience
+
+
+def hydrate_results(profiles, query_text: str = "", limit: int = 3):
+    """
+    Builds the search result rows for a page of profiles: each profile with
+    its top can help and want help experiences.
+    Costs one query however many profiles are on the page.
+    """
+    profiles = list(profiles)
+    if not profiles:
+        return []
+    top = {
+        (profile.id, exp_type): []
+        for profile in profiles
+        for exp_type in Experience.Type
+    }
+    by_id = {profile.id: profile for profile in profiles}
+    for experience in top_experiences(list(by_id), query_text, limit):
+        experience.profile = by_id[experience.profile_id]
+        top[(experience.profile_id, experience.exp_type)].append(experience)
+    return [
+        {
+            "profile": profile,
+            "can_help": top[(profile.id, Experience.Type.CAN_HELP)],
+            "want_help": top[(profile.id, Experience.Type.WANT_HELP)],
+        }
+        for profile in profiles
+    ]
@@ -0,0 +1,111 @@
+"""
+Keeps the django_session table from growing without bound.
+
+Django only deletes a session when its user logs out, so every expired
+session stays in the table until `clearsessions` runs. prune_expired_sessions
+deletes them in small batches, so it never holds long locks, and the worker
+runs it periodically (see send_queued_email --prune-sessions-every).
+"""
+import datetime as dt
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+BATCH_SIZE = 500
+
+
+def prune_expired_sessions(
+    batch_size: int = BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    pause: float = 0.0,
+) -> int:
+    """
+    Deletes expired sessions batch_size at a time and returns how many were
+    deleted. Only applies to the database session backends.
+
+    max_batches: stop after this many batches, None to delete every expired session \n
+    pause: seconds to sleep between batches, to leave room for other queries
+    """
+    if not uses_database_sessions():
+        return 0
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        expired = Session.objects.filter(expire_date__lt=timezone.now()).values("pk")
+        count, _ = Session.objects.filter(pk__in=expired[:batch_size]).delete()
+        deleted += count
+        batches += 1
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def uses_database_sessions() -> bool:
+    return settings.SESSION_ENGINE in [
+        "django.contrib.sessions.backends.db",
+        "django.contrib.sessions.backends.cached_db",
+    ]
+
+
+@dataclass
+class SessionReport:
+    total: int
+    expired: int
+    # sessions started per day, estimated from their expiry dates
+    started_per_day: Dict[dt.date, int]
+
+    @property
+    def daily_rate(self) -> float:
+        """
+        The average number of sessions started per day
+        """
+        if not self.started_per_day:
+            return 0.0
+        return sum(self.started_per_day.values()) / len(self.started_per_day)
+
+    @property
+    def steady_state(self) -> int:
+        """
+        Rows the table settles at if expired sessions are pruned, at the
+        current rate: sessions live SESSION_COOKIE_AGE.
+        """
+        return round(self.daily_rate * settings.SESSION_COOKIE_AGE / 86400)
+
+
+def session_report(days: int = 7) -> SessionReport:
+    """
+    The size of the session table and how fast it grows, over the last days.
+
+    Sessions only store their expiry date, which is set to SESSION_COOKIE_AGE
+    after the session was last saved, so that is when they are counted as started.
+    """
+    now = timezone.now()
+    age = dt.timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    sessions = Session.objects.all()
+    started = (
+        sessions.filter(expire_date__gte=now - dt.timedelta(days=days) + age)
+        .annotate(day=TruncDate("expire_date"))
+        .values("day")
+        .annotate(count=Count("pk"))
+    )
+    today = now.date()
+    started_per_day = {
+        today - dt.timedelta(days=day): 0 for day in reversed(range(days))
+    }
+    for row in started:
+        day = row["day"] - dt.timedelta(days=age.days)
+        if day in started_per_day:
+            started_per_day[day] += row["count"]
+    return SessionReport(
+        total=sessions.count(),
+        expired=sessions.filter(expire_date__lt=now).count(),
+        started_per_day=started_per_day,
+    )
@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,11 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "buddy_mentorship.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "buddy_mentorship.middleware.QueryInstrumentationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "buddy_mentorship.middleware.UserProfileMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "maintenance_mode.middleware.MaintenanceModeMiddleware",
@@ -96,6 +102,124 @@ DATABASES = {
     }
 }
 
+# Connections are kept open between requests for DB_CONN_MAX_AGE seconds (0 closes
+# them after every request) and, with DB_CONN_HEALTH_CHECKS, checked before being
+# reused, see signals.check_connections. DB_PGBOUNCER=true is for connecting through
+# pgbouncer in transaction pooling mode, which can't keep a server-side cursor open
+# across transactions. Re-applied in production.py, after django_heroku.
+
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER") == "true"
+
+DATABASE_CONNECTION_SETTINGS = {
+    "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+    "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "true") == "true",
+    "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
+}
+
+DATABASES["default"].update(DATABASE_CONNECTION_SETTINGS)
+
+
+# Cache
+# CACHE_BACKEND picks the backend: "locmem" (per process, the default outside of
+# production), "file" (shared by the processes on one machine) or "db" (shared by
+# every process, the default in production; run `python manage.py createcachetable`
+# first). CACHE_LOCATION overrides where
+# entries are kept and CACHE_TTL is the default lifetime in seconds.
+
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "buddy_mentorship"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.path.join(tempfile.gettempdir(), "buddy_mentorship_cache"),
+    ),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "buddy_mentorship_cache"),
+}
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_BACKENDS[CACHE_BACKEND][1]),
+        "TIMEOUT": int(os.getenv("CACHE_TTL", 300)),
+        "KEY_PREFIX": "buddy_mentorship",
+    }
+}
+
+
+# Row budget
+# The plan's limit on rows across every table and the share of it at which db_budget
+# and the worker start warning, see buddy_mentorship.budget.
+
+DB_ROW_LIMIT = int(os.getenv("DB_ROW_LIMIT", 10000))
+DB_ROW_WARNING = float(os.getenv("DB_ROW_WARNING", 0.8))
+
+
+# Query instrumentation
+# The share of requests (0 to 1) whose query count, SQL time, duplicate queries and
+# slowest statement are logged and sent as Server-Timing headers, see
+# buddy_mentorship.middleware.QueryInstrumentationMiddleware.
+
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv("QUERY_INSTRUMENTATION_SAMPLE_RATE", 0.05)
+)
+
+# Server
+# SERVER_INTERFACE is "wsgi" (gunicorn's threads, the default) or "asgi" (uvicorn's
+# worker, see gunicorn.conf.py). The skill autocomplete and sending a request are
+# routed to async views under ASGI only.
+
+SERVER_INTERFACE = os.getenv("SERVER_INTERFACE", "wsgi").lower()
+
+# Metrics
+# Each process writes its metrics to a file in METRICS_DIR (a temporary directory by
+# default), and /metrics serves their totals, with those the email worker publishes to
+# the database, in the Prometheus text format. When METRICS_TOKEN is set /metrics
+# requires an "Authorization: Bearer <METRICS_TOKEN>" header, otherwise it is only
+# served to staff.
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "buddy_mentorship": {
+            "handlers": ["console"],
+            "level": os.getenv("BUDDY_MENTORSHIP_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
+
+# Sessions
+# SESSION_BACKEND picks where sessions are kept: "db" (the default), "cached_db"
+# (the database, read through the cache), "cache" (only the cache) or
+# "signed_cookies" (in the browser, signed with SECRET_KEY, so nothing is read on
+# the server). The two cache ones need the "db" cache backend: with any other,
+# a session would only exist, or only be logged out, in some of the processes.
+
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "db")
+if SESSION_BACKEND in ["cache", "cached_db"] and CACHE_BACKEND != "db":
+    raise ImproperlyConfigured(
+        f"SESSION_BACKEND={SESSION_BACKEND} needs CACHE_BACKEND=db, the cache "
+        f"every process shares, not {CACHE_BACKEND}"
+    )
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+
+# how long a login lasts, in seconds (two weeks by default); expired sessions are
+# deleted by the worker, see buddy_mentorship.sessions
+SESSION_COOKIE_AGE = int(os.getenv("SESSION_COOKIE_AGE", 60 * 60 * 24 * 14))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -134,6 +258,15 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = "/static/"
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# webpack's output (npm run build), collected as static/bundles/ when built
+WEBPACK_OUTPUT = os.path.join(
+    os.path.dirname(BASE_DIR), "frontend", "static", "bundles"
+)
+STATICFILES_DIRS = (
+    [("bundles", WEBPACK_OUTPUT)] if os.path.isdir(WEBPACK_OUTPUT) else []
+)
 
 # Custom User Model
 AUTH_USER_MODEL = "users.User"
@@ -174,6 +307,8 @@ EMAIL_HOST_USER = os.environ["EMAIL_HOST_USER"]
 EMAIL_HOST_PASSWORD = os.environ["EMAIL_HOST_PASSWORD"]
 EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_ADDRESS
+# days sent and failed emails are kept in the outbox before the worker deletes them
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 7))
 
 # used for selenium tests
 CHROME_HEADLESS = os.getenv("CHROME_HEADLESS") == "true"
@@ -189,6 +324,8 @@ MAINTENANCE_MODE_IGNORE_ADMIN_SITE = True
 WEBPACK_LOADER = {
     "DEFAULT": {
         "BUNDLE_DIR_NAME": "bundles/",
-        "STATS_FILE": os.path.join(BASE_DIR, "static/webpack-stats.json"),
+        "STATS_FILE": os.path.join(
+            os.path.dirname(BASE_DIR), "frontend", "webpack-stats.json"
+        ),
     }
 }
\ No newline at end of file
@@ -1,6 +1,12 @@
 import os
 
 import django_heroku
+from django.core.exceptions import ImproperlyConfigured
+
+# the skill vocabulary's version and cache_stats' counters are shared through the
+# cache, which locmem keeps per process; the table is made by createcachetable
+os.environ.setdefault("CACHE_BACKEND", "db")
+
 from .base import *
 
 DEBUG = os.getenv("DEBUG_MODE") == "true"
@@ -11,7 +17,23 @@ DEBUG = os.getenv("DEBUG_MODE") == "true"
 # will only work for one admin
 ADMINS = [tuple(os.getenv("ADMINS").split(","))] if os.getenv("ADMINS") else []
 
-django_heroku.settings(locals())
+# logging=False keeps base.py's LOGGING, which sends the buddy_mentorship logger's
+# INFO lines (e.g. the sampled query log) to the console
+django_heroku.settings(locals(), staticfiles=False, logging=False)
+
+# collected with hashed names and compressed copies (also brotli once the Brotli
+# package is installed), see buddy_mentorship/staticfiles.py
+STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+MIDDLEWARE = ["buddy_mentorship.staticfiles.StaticFilesMiddleware"] + MIDDLEWARE
+os.makedirs(STATIC_ROOT, exist_ok=True)
+
+if CACHE_BACKEND == "locmem":
+    raise ImproperlyConfigured(
+        "CACHE_BACKEND=locmem gives each process its own cache, use db (or file)"
+    )
+
+# django_heroku replaces DATABASES from DATABASE_URL with its own CONN_MAX_AGE
+DATABASES["default"].update(DATABASE_CONNECTION_SETTINGS)
 
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 SECURE_SSL_REDIRECT = True
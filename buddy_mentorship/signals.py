@@ -0,0 +1,83 @@
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.users.models import User
+
+from .models import Experience, Profile, ProfileEligibility, Skill
+from .skills import invalidate_vocabulary
+
+
+@receiver(post_save, sender=Skill)
+def skill_saved(sender, instance, created, **kwargs):
+    invalidate_vocabulary()
+    if not created:
+        # the display name shows on every profile with the skill
+        Profile.objects.touch(
+            Experience.objects.filter(skill=instance).values("profile_id")
+        )
+
+
+@receiver(post_delete, sender=Skill)
+def skill_deleted(sender, instance, **kwargs):
+    # its experiences are deleted first and touch their profiles
+    invalidate_vocabulary()
+
+
+@receiver(pre_save, sender=Profile)
+def profile_saving(sender, instance, **kwargs):
+    # writing back the version loaded with the instance would undo touch()es
+    # made since; profile_saved increments it in SQL instead
+    if not instance._state.adding:
+        instance.cache_version = F("cache_version")
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, **kwargs):
+    Profile.objects.touch([instance.id])
+    instance.refresh_from_db(fields=["cache_version"])
+    Profile.objects.forget(instance)
+    ProfileEligibility.refresh(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def profile_deleted(sender, instance, **kwargs):
+    Profile.objects.forget(instance)
+
+
+@receiver(post_save, sender=Experience)
+@receiver(post_delete, sender=Experience)
+def experience_changed(sender, instance, **kwargs):
+    Profile.objects.touch([instance.profile_id])
+    ProfileEligibility.refresh_experiences([instance.profile_id])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # logins save last_login only
+    if created or (update_fields is not None and "is_active" not in update_fields):
+        return
+    ProfileEligibility.objects.filter(profile__user=instance).update(
+        is_active=instance.is_active
+    )
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """
+    Closes persistent connections that stopped working while idle (e.g. after
+    a database restart or failover), so the request opens a new one instead
+    of failing. Runs after Django's close_old_connections, so only reused
+    connections are checked, for databases with CONN_HEALTH_CHECKS.
+
+    Django 4.1 does this itself for the same setting.
+    """
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not connection.is_usable()
+        ):
+            connection.close()
@@ -0,0 +1,112 @@
+import heapq
+import time
+from bisect import bisect_left
+from typing import List, Optional
+
+from django.db import transaction
+from django.db.models import Count
+
+from .cache import Namespace
+from .models import Skill
+
+# only its version is used, to tell other processes the Skill table changed
+vocabulary_cache = Namespace("skills")
+
+# popularity only changes with experiences, which don't invalidate the vocabulary,
+# so it is reloaded at least this often (seconds)
+MAX_AGE = 300
+
+
+class SkillVocabulary:
+    """
+    An in-memory copy of the Skill table, kept as parallel tuples sorted by
+    casefolded skill name so prefix matches can be found by bisection.
+    """
+
+    def __init__(self, skills):
+        """
+        skills: iterable of (id, skill, display_name, popularity)
+        """
+        rows = sorted(skills, key=lambda row: (row[1].casefold(), row[0]))
+        self.ids = tuple(row[0] for row in rows)
+        self.keys = tuple(row[1].casefold() for row in rows)
+        self.display_names = tuple(row[2] for row in rows)
+        self.popularity = tuple(row[3] for row in rows)
+        self._ids_by_skill = {row[1]: row[0] for row in rows}
+
+    @classmethod
+    def load(cls) -> "SkillVocabulary":
+        return cls(
+            Skill.objects.annotate(popularity=Count("experience")).values_list(
+                "id", "skill", "display_name", "popularity"
+            )
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, skill: str):
+        return skill in self._ids_by_skill
+
+    def get_id(self, skill: str) -> Optional[int]:
+        return self._ids_by_skill.get(skill)
+
+    def search(self, term: str, limit: int = 10) -> List[str]:
+        """
+        Display names of skills containing term, ranked like
+        Skill.objects.autocomplete: prefix matches first, then by popularity.
+        """
+        term = term.casefold()
+        if not term:
+            return []
+
+        def rank(i, is_prefix):
+            return (not is_prefix, -self.popularity[i], self.ids[i])
+
+        ranked = []
+        i = bisect_left(self.keys, term)
+        while i < len(self.keys) and self.keys[i].startswith(term):
+            ranked.append(rank(i, True) + (i,))
+            i += 1
+        if len(ranked) < limit:
+            ranked.extend(
+                rank(i, False) + (i,)
+                for i, key in enumerate(self.keys)
+                if term in key and not key.startswith(term)
+            )
+        return [self.display_names[row[-1]] for row in heapq.nsmallest(limit, ranked)]
+
+
+_loaded = (None, None, 0.0)  # (version, vocabulary, loaded at)
+
+
+def get_vocabulary() -> SkillVocabulary:
+    """
+    The process-local vocabulary, reloaded when another process has changed a
+    Skill (signalled through the version of vocabulary_cache) or when it is
+    older than MAX_AGE.
+    """
+    global _loaded
+    version = vocabulary_cache.version()
+    loaded_version, vocabulary, loaded_at = _loaded
+    fresh = (
+        vocabulary is not None
+        and loaded_version == version
+        and time.monotonic() - loaded_at <= MAX_AGE
+    )
+    vocabulary_cache.count(fresh)
+    if not fresh:
+        vocabulary = SkillVocabulary.load()
+        _loaded = (version, vocabulary, time.monotonic())
+    return vocabulary
+
+
+def invalidate_vocabulary():
+    """
+    Makes every process reload the vocabulary on its next use.
+
+    The version is bumped right away and again once the transaction commits,
+    so a process that reloaded before the commit doesn't keep the old skills.
+    """
+    vocabulary_cache.invalidate()
+    transaction.on_commit(vocabulary_cache.invalidate)
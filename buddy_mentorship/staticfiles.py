@@ -0,0 +1,23 @@
+"""
+Serving of collected static files in production (see settings/production.py).
+
+Django's files get a content hash in their names from the manifest storage,
+webpack's bundles from webpack.config.js; both are served with compressed
+variants and cached by browsers for good, without revalidating. Files
+without a hash, e.g. a bundle requested by its name before the hash, are
+cached for WHITENOISE_MAX_AGE.
+"""
+import re
+
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+# e.g. bundles/main-1b2c3d4e5f6a7b8c9d0e.js, see output.filename in webpack.config.js
+WEBPACK_HASHED = re.compile(r"^bundles/.+-[0-9a-f]{16,}\.js$")
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    def immutable_file_test(self, path, url):
+        if super().immutable_file_test(path, url):
+            return True
+        name = url[len(self.static_prefix) :]
+        return url.startswith(self.static_prefix) and bool(WEBPACK_HASHED.match(name))
@@ -1,24 +1,73 @@
 import datetime as dt
+import json
 import os
-
+import random
+import runpy
+import tempfile
+import urllib.parse
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test.utils import CaptureQueriesContext
 from django.test import (
+    AsyncClient,
+    AsyncRequestFactory,
     Client,
+    LiveServerTestCase,
     override_settings,
     TestCase,
     override_settings,
     TransactionTestCase,
 )
+from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.contrib.postgres.search import SearchQuery
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.db.models import Q
+from django.forms.models import model_to_dict
 from django.urls import reverse
+from django.templatetags.static import static
 from django.utils import timezone
 
-from .models import BuddyRequest, BuddyRequestManager, Profile, Skill, Experience
+from .models import (
+    BuddyRequest,
+    BuddyRequestManager,
+    Profile,
+    Skill,
+    Experience,
+    MetricsSnapshot,
+    OutboundEmail,
+    ProfileEligibility,
+    TableSizeSnapshot,
+)
+from . import benchmarks, metrics
+from .budget import budget_report, check_budget, estimated_counts
+from .cache import Namespace, get_stats, reset_stats
+from .imports import ImportRow, InvalidImport, import_experiences, parse_rows
+from .management.commands.send_queued_email import Command as SendQueuedEmailCommand
+from .middleware import QueryRecorder
+from .outbox import NotificationDispatcher, deliver_queued_emails
+from .relationships import RelationshipState
+from .sessions import prune_expired_sessions, session_report
+from .signals import check_connections
+from .skills import get_vocabulary, invalidate_vocabulary
 from .views import (
+    SKILL_SEARCH_LIMIT,
+    Search,
     can_request_as_mentor,
     can_offer_to_mentor,
     send_request,
+    send_request_async,
+    skill_search_async,
     existing_requests,
     required_experiences,
 )
@@ -536,6 +585,7 @@ class SendBuddyRequestTest(TestCase):
         assert response.status_code == 302
         assert BuddyRequest.objects.get(requestor=mentee)
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 1
         assert mail.outbox[0].subject == "New ChiPy Mentorship Request!"
         profile_link = f"<a href='{os.getenv('APP_URL')}{reverse('profile',args=[mentee_profile.id])}'>"
@@ -569,6 +619,7 @@ class SendBuddyRequestTest(TestCase):
         buddy_request.status = 1
         buddy_request.save()
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 2
         assert mail.outbox[1].subject == "ChiPy Mentorship Request Accepted!"
         profile_link = f"<a href='{os.getenv('APP_URL')}{reverse('profile',args=[mentor_profile.id])}'>"
@@ -590,6 +641,7 @@ class SendBuddyRequestTest(TestCase):
         buddy_request.status = BuddyRequest.Status.REJECTED
         buddy_request.save()
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 1
 
     def test_complete_request(self):
@@ -605,11 +657,13 @@ class SendBuddyRequestTest(TestCase):
             status=BuddyRequest.Status.ACCEPTED,
         )
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 1
 
         buddy_request.status = BuddyRequest.Status.COMPLETED
         buddy_request.save()
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 3
 
         email_to_mentor = mail.outbox[1]
@@ -676,6 +730,7 @@ class SendBuddyOfferTest(TestCase):
         assert response.status_code == 302
         assert BuddyRequest.objects.get(requestor=mentor)
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 1
         assert mail.outbox[0].subject == "New ChiPy Mentorship Offer!"
         profile_link = f"<a href='{os.getenv('APP_URL')}{reverse('profile',args=[mentor_profile.id])}'>"
@@ -709,6 +764,7 @@ class SendBuddyOfferTest(TestCase):
         buddy_request.status = 1
         buddy_request.save()
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 2
         assert mail.outbox[1].subject == "ChiPy Mentorship Offer Accepted!"
         profile_link = f"<a href='{os.getenv('APP_URL')}{reverse('profile',args=[mentee_profile.id])}'>"
@@ -730,6 +786,7 @@ class SendBuddyOfferTest(TestCase):
         buddy_request.status = 2
         buddy_request.save()
 
+        deliver_queued_emails()
         # right now this doesn't do anything
         assert len(mail.outbox) == 1
 
@@ -746,11 +803,13 @@ class SendBuddyOfferTest(TestCase):
             status=BuddyRequest.Status.ACCEPTED,
         )
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 1
 
         buddy_request.status = BuddyRequest.Status.COMPLETED
         buddy_request.save()
 
+        deliver_queued_emails()
         assert len(mail.outbox) == 3
 
         email_to_mentee = mail.outbox[1]
@@ -772,6 +831,149 @@ class SendBuddyOfferTest(TestCase):
         assert mentor.email in email_to_mentor.recipients()
 
 
+class OutboundEmailTest(TestCase):
+    def setUp(self):
+        mentee = User.objects.create_user(email="mentee@user.com")
+        Profile.objects.create(user=mentee)
+        mentor = User.objects.create_user(email="mentor@user.com")
+        Profile.objects.create(user=mentor)
+        BuddyRequest.objects.create(
+            requestor=mentee,
+            requestee=mentor,
+            message="Please be my mentor",
+            request_type=BuddyRequest.RequestType.REQUEST,
+        )
+
+    def test_save_queues_email(self):
+        assert len(mail.outbox) == 0
+        email = OutboundEmail.objects.get()
+        assert email.status == OutboundEmail.Status.QUEUED
+        assert email.recipient == "mentor@user.com"
+        assert email.subject == "New ChiPy Mentorship Request!"
+        assert "<a href=" not in email.body
+        assert "<a href=" in email.html_body
+
+    def test_deliver_queued_emails(self):
+        assert deliver_queued_emails() == 1
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].alternatives[0][1] == "text/html"
+        email = OutboundEmail.objects.get()
+        assert email.status == OutboundEmail.Status.SENT
+        assert email.attempts == 1
+        assert email.sent_at
+
+        assert deliver_queued_emails() == 0
+        assert len(mail.outbox) == 1
+
+    def test_failed_delivery_is_retried(self):
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=SMTPException("connection refused"),
+        ):
+            assert deliver_queued_emails(max_attempts=2) == 0
+            email = OutboundEmail.objects.get()
+            assert email.status == OutboundEmail.Status.QUEUED
+            assert email.attempts == 1
+            assert email.last_error == "connection refused"
+            assert email.send_after > timezone.now()
+
+            # not due again until the backoff has passed
+            assert deliver_queued_emails(max_attempts=2) == 0
+            assert OutboundEmail.objects.get().attempts == 1
+
+            OutboundEmail.objects.update(send_after=timezone.now())
+            deliver_queued_emails(max_attempts=2)
+            email = OutboundEmail.objects.get()
+            assert email.status == OutboundEmail.Status.FAILED
+            assert email.attempts == 2
+
+        assert len(mail.outbox) == 0
+
+    def test_send_queued_email_command(self):
+        out = StringIO()
+        call_command("send_queued_email", stdout=out)
+        assert "Delivered 1 emails" in out.getvalue()
+        assert len(mail.outbox) == 1
+
+    def test_prune(self):
+        deliver_queued_emails()
+        assert OutboundEmail.objects.prune() == 0
+
+        OutboundEmail.objects.create(
+            subject="Hi",
+            body="Hi",
+            recipient="mentee@user.com",
+            status=OutboundEmail.Status.FAILED,
+            send_after=timezone.now() - dt.timedelta(days=8),
+        )
+        queued = OutboundEmail.objects.create(
+            subject="Hi",
+            body="Hi",
+            recipient="mentee@user.com",
+            created=timezone.now() - dt.timedelta(days=30),
+        )
+        OutboundEmail.objects.filter(status=OutboundEmail.Status.SENT).update(
+            sent_at=timezone.now() - dt.timedelta(days=8)
+        )
+        with override_settings(OUTBOX_RETENTION_DAYS=7):
+            assert OutboundEmail.objects.prune() == 2
+        assert list(OutboundEmail.objects.all()) == [queued]
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+
+@override_settings(EMAIL_BACKEND="buddy_mentorship.tests.CountingEmailBackend")
+class NotificationDispatcherTest(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+        create_test_users(3, "mentee", [])
+        mentor = create_test_users(1, "mentor", [])[0]
+        for mentee in User.objects.filter(email__startswith="mentee"):
+            BuddyRequest.objects.create(
+                requestor=mentee,
+                requestee=mentor,
+                request_type=BuddyRequest.RequestType.REQUEST,
+                status=BuddyRequest.Status.COMPLETED,
+            )
+
+    def test_batch_reuses_connection(self):
+        dispatcher = NotificationDispatcher(batch_size=50)
+        stats = dispatcher.dispatch()
+        assert stats.sent == 6
+        assert stats.failed == 0
+        assert stats.connections == 1
+        assert stats.messages_per_connection == 6
+        assert stats.seconds > 0
+        assert CountingEmailBackend.opened == 1
+        assert len(mail.outbox) == 6
+
+    def test_batches_and_totals(self):
+        dispatcher = NotificationDispatcher(batch_size=4)
+        assert dispatcher.dispatch().sent == 4
+        assert dispatcher.dispatch().sent == 2
+        assert dispatcher.dispatch().sent == 0
+        assert dispatcher.totals.sent == 6
+        assert dispatcher.totals.connections == 2
+        assert CountingEmailBackend.opened == 2
+
+    def test_failure_reopens_connection(self):
+        with mock.patch.object(
+            CountingEmailBackend,
+            "send_messages",
+            side_effect=[SMTPException("dropped"), 1, 1, 1, 1, 1],
+        ):
+            stats = NotificationDispatcher().dispatch()
+        assert stats.sent == 5
+        assert stats.failed == 1
+        assert stats.connections == 2
+
+
 class BuddyRequestModelTest(TestCase):
     def setUp(self):
         hari = User.objects.create_user(
@@ -882,6 +1084,393 @@ class BuddyRequestModelTest(TestCase):
         )
 
 
+class BuddyRequestIndexTest(TestCase):
+    """
+    Checks the planner picks the indexes of migration 0017_buddyrequest_indexes
+    for the hot BuddyRequest lookups, on a request history large enough for
+    sequential scans to lose.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        users = User.objects.bulk_create(
+            User(email=f"user{i}@buddy.com", first_name=f"user{i}") for i in range(200)
+        )
+        statuses = [BuddyRequest.Status.REJECTED] * 6 + [
+            BuddyRequest.Status.NEW,
+            BuddyRequest.Status.ACCEPTED,
+            BuddyRequest.Status.COMPLETED,
+        ]
+        BuddyRequest.objects.bulk_create(
+            BuddyRequest(
+                requestor=requestor,
+                requestee=requestee,
+                request_type=rng.choice(BuddyRequest.RequestType.values),
+                status=rng.choice(statuses),
+                message="",
+            )
+            for requestor, requestee in (
+                rng.sample(users, 2) for _ in range(12000)
+            )
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE buddy_mentorship_buddyrequest")
+        cls.hari, cls.elizabeth = users[:2]
+
+    def test_pair_lookup(self):
+        find_by_users = BuddyRequest.objects.filter(
+            requestor=self.hari,
+            requestee=self.elizabeth,
+            request_type=BuddyRequest.RequestType.REQUEST,
+        ).order_by("id")[:1]
+        assert plan_index_names(find_by_users) == {"buddyrequest_pair_idx"}
+
+        exchanged = BuddyRequest.objects.filter(
+            Q(requestor=self.hari, requestee=self.elizabeth)
+            | Q(requestor=self.elizabeth, requestee=self.hari)
+        )
+        assert plan_index_names(exchanged) == {"buddyrequest_pair_idx"}
+
+    def test_requests_page(self):
+        inbox = BuddyRequest.objects.inbox(self.hari)[:51]
+        assert plan_index_names(inbox) == {
+            "buddyrequest_sent_open_idx",
+            "buddyrequest_received_open_idx",
+        }
+
+
+class RelationshipStateTest(TestCase):
+    def setUp(self):
+        pandas = Skill.objects.create(skill="pandas")
+        create_test_users(
+            1,
+            "mentor",
+            [{"skill": pandas, "level": 4, "exp_type": Experience.Type.CAN_HELP}],
+        )
+        create_test_users(
+            1,
+            "mentee",
+            [{"skill": pandas, "level": 1, "exp_type": Experience.Type.WANT_HELP}],
+        )
+
+    def test_load_query_count(self):
+        mentee = User.objects.get(email="mentee0@buddy.com")
+        mentee_profile = Profile.objects.get(user=mentee)
+        mentor_profile = Profile.objects.select_related("user").get(
+            user__email="mentor0@buddy.com"
+        )
+        BuddyRequest.objects.create(
+            requestor=mentee,
+            requestee=mentor_profile.user,
+            request_type=BuddyRequest.RequestType.REQUEST,
+        )
+        offer = BuddyRequest.objects.create(
+            requestor=mentor_profile.user,
+            requestee=mentee,
+            request_type=BuddyRequest.RequestType.OFFER,
+        )
+
+        with self.assertNumQueries(2):
+            state = RelationshipState.load(mentee, mentee_profile, mentor_profile)
+
+        with self.assertNumQueries(0):
+            assert state.request_from_viewer.requestor_id == mentee.id
+            assert state.offer_to_viewer == offer
+            assert state.offer_from_viewer is None
+            assert state.request_to_viewer is None
+            assert state.viewer_wants_help and not state.viewer_can_help
+            assert state.other_can_help and not state.other_wants_help
+            assert not state.can_request
+            assert not state.can_offer
+            assert not state.cannot_request_no_skills
+            assert state.cannot_offer_no_skills
+
+    def test_load_own_profile(self):
+        mentor_profile = Profile.objects.select_related("user").get(
+            user__email="mentor0@buddy.com"
+        )
+        with self.assertNumQueries(0):
+            state = RelationshipState.load(
+                mentor_profile.user, mentor_profile, mentor_profile
+            )
+            assert not state.can_request
+            assert not state.can_offer
+
+    def test_between(self):
+        mentee = User.objects.get(email="mentee0@buddy.com")
+        mentor = User.objects.get(email="mentor0@buddy.com")
+        with self.assertNumQueries(2):
+            state = RelationshipState.between(mentee, mentor)
+        assert state.can_request
+        assert not state.can_offer
+        assert RelationshipState.between(mentor, mentee).can_offer
+
+        no_profile = User.objects.create_user(email="no_profile@user.com")
+        assert not RelationshipState.between(mentee, no_profile).can_request
+        assert not RelationshipState.between(no_profile, mentor).can_request
+
+
+class ProfileEligibilityTest(TestCase):
+    def setUp(self):
+        self.pandas = Skill.objects.create(skill="pandas")
+        self.flask = Skill.objects.create(skill="flask")
+        self.user = create_test_users(1, "user", [], looking_for_mentees=False)[0]
+        self.profile = Profile.objects.get(user=self.user)
+
+    def eligibility(self):
+        return ProfileEligibility.objects.get(profile=self.profile)
+
+    def test_created_with_profile(self):
+        eligibility = self.eligibility()
+        assert not eligibility.has_can_help
+        assert not eligibility.has_want_help
+        assert eligibility.looking_for_mentors
+        assert not eligibility.looking_for_mentees
+        assert eligibility.is_active
+
+    def test_follows_experiences(self):
+        can_help = Experience.objects.create(
+            profile=self.profile,
+            skill=self.pandas,
+            level=3,
+            exp_type=Experience.Type.CAN_HELP,
+        )
+        assert self.eligibility().has_can_help
+        assert not self.eligibility().has_want_help
+
+        want_help = Experience.objects.create(
+            profile=self.profile,
+            skill=self.flask,
+            level=1,
+            exp_type=Experience.Type.WANT_HELP,
+        )
+        assert self.eligibility().has_want_help
+
+        can_help.exp_type = Experience.Type.WANT_HELP
+        can_help.save()
+        assert not self.eligibility().has_can_help
+
+        can_help.delete()
+        want_help.delete()
+        assert not self.eligibility().has_want_help
+
+    def test_follows_profile_and_user(self):
+        self.profile.looking_for_mentors = False
+        self.profile.looking_for_mentees = True
+        self.profile.save()
+        eligibility = self.eligibility()
+        assert not eligibility.looking_for_mentors
+        assert eligibility.looking_for_mentees
+
+        self.user.is_active = False
+        self.user.save()
+        assert not self.eligibility().is_active
+
+        # logins only save last_login
+        self.user.is_active = True
+        self.user.save(update_fields=["last_login"])
+        assert not self.eligibility().is_active
+        self.user.save(update_fields=["is_active"])
+        assert self.eligibility().is_active
+
+    def test_deleted_with_profile(self):
+        Experience.objects.create(
+            profile=self.profile,
+            skill=self.pandas,
+            level=3,
+            exp_type=Experience.Type.CAN_HELP,
+        )
+        self.profile.delete()
+        assert not ProfileEligibility.objects.exists()
+        self.pandas.delete()
+        self.user.delete()
+
+    def test_of(self):
+        Experience.objects.create(
+            profile=self.profile,
+            skill=self.pandas,
+            level=3,
+            exp_type=Experience.Type.CAN_HELP,
+        )
+        other = Profile.objects.get(user=create_test_users(1, "other", [])[0])
+        ProfileEligibility.objects.filter(profile=other).delete()
+
+        profile = Profile.objects.select_related("eligibility").get(id=self.profile.id)
+        with self.assertNumQueries(0):
+            assert ProfileEligibility.of([profile])[profile.id].has_can_help
+
+        with self.assertNumQueries(1):
+            records = ProfileEligibility.of([self.profile, other])
+        assert records[self.profile.id].has_can_help
+        assert not records[other.id].has_can_help
+
+    def test_inactive_users_not_searchable(self):
+        Experience.objects.create(
+            profile=self.profile,
+            skill=self.pandas,
+            level=3,
+            exp_type=Experience.Type.WANT_HELP,
+        )
+        searcher = create_test_users(1, "searcher", [])[0]
+        c = Client()
+        c.force_login(searcher)
+
+        def found():
+            response = c.get("/search/?type=mentee")
+            return [result["profile"] for result in response.context_data["results"]]
+
+        assert found() == [self.profile]
+        self.user.is_active = False
+        self.user.save()
+        assert found() == []
+
+
+class ProfileFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python = Skill.objects.create(skill="python")
+        self.mentor = create_test_users(
+            1,
+            "mentor",
+            [
+                {
+                    "skill": self.python,
+                    "level": 4,
+                    "exp_type": Experience.Type.CAN_HELP,
+                }
+            ],
+        )[0]
+        self.profile = Profile.objects.get(user=self.mentor)
+        self.mentees = create_test_users(2, "mentee", [])
+
+    def render(self, user):
+        client = Client()
+        client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("profile", args=[self.profile.id]))
+        assert response.status_code == 200
+        skill_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'ORDER BY "buddy_mentorship_experience"."level"' in query["sql"]
+        ]
+        return response.content.decode(), len(skill_queries)
+
+    def test_viewers_share_fragment(self):
+        content, skill_queries = self.render(self.mentees[0])
+        assert "Python" in content
+        assert "4/5" in content
+        assert skill_queries == 2
+
+        content, skill_queries = self.render(self.mentees[1])
+        assert "Python" in content
+        assert "4/5" in content
+        assert skill_queries == 0
+
+    def test_owner_fragment_is_separate(self):
+        self.render(self.mentees[0])
+        content, skill_queries = self.render(self.mentor)
+        assert skill_queries == 2
+        assert "Add New Skill" in content
+
+        content, skill_queries = self.render(self.mentees[1])
+        assert skill_queries == 0
+        assert "Add New Skill" not in content
+
+    def test_request_buttons_not_cached(self):
+        Experience.objects.create(
+            profile=Profile.objects.get(user=self.mentees[0]),
+            skill=self.python,
+            level=1,
+            exp_type=Experience.Type.WANT_HELP,
+        )
+        content, skill_queries = self.render(self.mentees[0])
+        assert 'id="requestForm"' in content
+        content, skill_queries = self.render(self.mentees[1])
+        assert skill_queries == 0
+        assert 'id="requestForm"' not in content
+
+    def test_experience_changes(self):
+        self.render(self.mentees[0])
+        experience = Experience.objects.get(profile=self.profile)
+        experience.level = 5
+        experience.save()
+        content, skill_queries = self.render(self.mentees[0])
+        assert skill_queries == 2
+        assert "5/5" in content
+
+        Experience.objects.create(
+            profile=self.profile,
+            skill=Skill.objects.create(skill="django"),
+            level=1,
+            exp_type=Experience.Type.WANT_HELP,
+        )
+        content, skill_queries = self.render(self.mentees[0])
+        assert "Django" in content
+
+        experience.delete()
+        content, skill_queries = self.render(self.mentees[0])
+        # the footer mentions the Chicago Python User Group
+        assert "5/5" not in content
+
+    def test_skill_changes(self):
+        self.render(self.mentees[0])
+        self.python.display_name = "CPython"
+        self.python.save()
+        content, skill_queries = self.render(self.mentees[0])
+        assert "CPython" in content
+
+    def test_profile_changes(self):
+        content, skill_queries = self.render(self.mentees[0])
+        assert 'id="lookingForMenteesBadge"' in content
+        self.profile.looking_for_mentees = False
+        self.profile.save()
+        content, skill_queries = self.render(self.mentees[0])
+        assert 'id="notLookingForMenteesBadge"' in content
+
+    def test_save_keeps_concurrent_touches(self):
+        stale = Profile.objects.get(id=self.profile.id)
+        Profile.objects.touch([self.profile.id])
+        touched = Profile.objects.get(id=self.profile.id).cache_stamp
+        stale.bio = "Updated"
+        stale.save()
+        assert stale.cache_stamp not in [touched, "0"]
+        assert Profile.objects.get(id=self.profile.id).cache_stamp == stale.cache_stamp
+
+        stale.save(update_fields=["bio"])
+        assert int(stale.cache_stamp) == int(touched) + 2
+
+    def test_stamp_is_shared_between_processes(self):
+        self.render(self.mentees[0])
+        stamp = Profile.objects.get(id=self.profile.id).cache_stamp
+        # another process' cache never sees the stamps of this one
+        cache.clear()
+        assert Profile.objects.get(id=self.profile.id).cache_stamp == stamp
+
+        import_experiences(
+            [
+                ImportRow(
+                    email=self.mentor.email,
+                    skill="python",
+                    level=2,
+                    exp_type=Experience.Type.CAN_HELP,
+                )
+            ]
+        )
+        assert Profile.objects.get(id=self.profile.id).cache_stamp != stamp
+        content, skill_queries = self.render(self.mentees[0])
+        assert "2/5" in content
+
+    def test_other_profiles_unaffected(self):
+        self.render(self.mentees[0])
+        mentee_profile = Profile.objects.get(user=self.mentees[0])
+        mentee_profile.bio = "changed"
+        mentee_profile.save()
+        content, skill_queries = self.render(self.mentees[1])
+        assert skill_queries == 0
+
+
 class ProfileEditTest(TestCase):
     def setUp(self):
         user = User.objects.create_user(
@@ -1191,6 +1780,49 @@ class SearchTest(TestCase):
             Experience.objects.get(profile__user=mentor2, skill__skill="Flask")
         ]
 
+    def test_page_query_count_is_constant(self):
+        user = User.objects.get(email="elizabeth@bennet.org")
+        pandas = Skill.objects.get(skill="pandas")
+        flask = Skill.objects.get(skill="Flask")
+        create_test_users(
+            15,
+            "busy_mentor",
+            [
+                {"skill": pandas, "level": 5, "exp_type": Experience.Type.CAN_HELP},
+                {"skill": flask, "level": 2, "exp_type": Experience.Type.CAN_HELP},
+            ],
+        )
+        c = Client()
+        c.force_login(user)
+
+        query_counts = []
+        for paginate_by in [5, 15]:
+            with mock.patch.object(Search, "paginate_by", paginate_by):
+                for url in ["/search/", "/search/?q=pandas"]:
+                    with CaptureQueriesContext(connection) as queries:
+                        response = c.get(url)
+                    assert len(response.context_data["results"]) == paginate_by
+                    query_counts.append((url, len(queries)))
+        assert query_counts[:2] == query_counts[2:]
+
+    def test_search_results_keep_ranking(self):
+        user = User.objects.get(email="elizabeth@bennet.org")
+        mentor1 = User.objects.get(email="mr@bennet.org")
+        c = Client()
+        c.force_login(user)
+        response = c.get("/search/?type=mentor")
+        for result in response.context_data["results"]:
+            profile = result["profile"]
+            assert list(result["can_help"]) == list(profile.get_top_can_help())
+            assert list(result["want_help"]) == list(profile.get_top_want_help())
+
+        response = c.get("/search/?type=mentee&q=pandas")
+        for result in response.context_data["results"]:
+            profile = result["profile"]
+            assert list(result["want_help"]) == list(
+                profile.get_top_want_help("pandas")
+            )
+
     def test_user_status(self):
         user = User.objects.get(email="elizabeth@bennet.org")
         c = Client()
@@ -1234,28 +1866,129 @@ class SearchTest(TestCase):
         )
         c = Client()
         c.force_login(user)
-        response = c.get("/search/?q=data%2B&type=mentor&page=2")
-        assert response.status_code == 200
 
-        first_page_url = response.context_data["first_page_url"]
-        assert first_page_url == "?q=data%2B&type=mentor&page=1"
-        prev_page_url = response.context_data["prev_page_url"]
-        assert prev_page_url == "?q=data%2B&type=mentor&page=1"
-        next_page_url = response.context_data["next_page_url"]
-        assert next_page_url == "?q=data%2B&type=mentor&page=3"
-        last_page_url = response.context_data["last_page_url"]
-        assert last_page_url == "?q=data%2B&type=mentor&page=last"
+        def results(url):
+            response = c.get(f"/search/{url}")
+            assert response.status_code == 200
+            profiles = [
+                result["profile"] for result in response.context_data["results"]
+            ]
+            return response.context_data, profiles
+
+        first_page, first_profiles = results("?q=data%2B&type=mentor")
+        assert "first_page_url" not in first_page
+        assert "prev_page_url" not in first_page
+        assert len(first_profiles) == 5
+
+        # walk forward through every page
+        pages = [first_page]
+        seen = list(first_profiles)
+        while "next_page_url" in pages[-1]:
+            next_page_url = pages[-1]["next_page_url"]
+            assert next_page_url.startswith("?q=data%2B&type=mentor&cursor=")
+            page, profiles = results(next_page_url)
+            pages.append(page)
+            seen.extend(profiles)
+        assert len(pages) == 3
+        assert len(seen) == len(set(seen)) == 15
+
+        second_page = pages[1]
+        assert second_page["first_page_url"] == "?q=data%2B&type=mentor"
+        assert results(second_page["first_page_url"])[1] == first_profiles
+        assert results(second_page["prev_page_url"])[1] == first_profiles
+
+        last_page, last_profiles = results(first_page["last_page_url"])
+        assert last_profiles == seen[-5:]
+        assert "next_page_url" not in last_page
+        assert results(last_page["prev_page_url"])[1] == seen[5:10]
+
+        # cursors are only good for the search they were made for
+        cursor = second_page["next_page_url"].split("cursor=")[1]
+        tampered = f"?q=data%2B&type=mentor&cursor={cursor}x"
+        assert results(tampered)[1] == first_profiles
+        other_search = results(f"?q=data&type=mentor&cursor={cursor}")[1]
+        assert other_search == results("?q=data&type=mentor")[1]
+
+    def test_no_count_query(self):
+        user = User.objects.get(email="elizabeth@bennet.org")
+        c = Client()
+        c.force_login(user)
+        for url in ["/search/", "/search/?q=pandas"]:
+            with CaptureQueriesContext(connection) as queries:
+                response = c.get(url)
+            assert response.context_data["result_count"] is None
+            assert not any("COUNT(" in query["sql"] for query in queries)
+            assert not any("OFFSET" in query["sql"] for query in queries)
+
+    def test_count_modes(self):
+        user = User.objects.get(email="elizabeth@bennet.org")
+        c = Client()
+        c.force_login(user)
+        with mock.patch.object(Search, "count_mode", "exact"):
+            exact = c.get("/search/?type=mentor").context_data
+        assert exact["result_count"] == Profile.objects.filter(
+            looking_for_mentees=True, experience__exp_type=Experience.Type.CAN_HELP
+        ).exclude(user=user).distinct().count()
+        assert not exact["result_count_is_approximate"]
 
-        response = c.get(f"/search/{prev_page_url}")
-        assert response.status_code == 200
-        response = c.get(f"/search/{next_page_url}")
-        assert response.status_code == 200
-        response = c.get(f"/search/{last_page_url}")
-        assert response.status_code == 200
+        with mock.patch.object(Search, "count_mode", "approximate"):
+            approximate = c.get("/search/?type=mentor")
+        assert isinstance(approximate.context_data["result_count"], int)
+        assert approximate.context_data["result_count_is_approximate"]
+        assert b"About " in approximate.content
+
+
+class SearchDocumentTest(TestCase):
+    def setUp(self):
+        self.pandas = Skill.objects.create(skill="pandas")
+        self.user = create_test_users(1, "user", [])[0]
+        self.profile = Profile.objects.get(user=self.user)
+
+    def matches(self, document, text):
+        return Profile.objects.filter(
+            id=self.profile.id, **{document: SearchQuery(text)}
+        ).exists()
+
+    def test_profile_and_user_changes(self):
+        assert self.matches("can_help_document", "user0")
+        assert self.matches("want_help_document", "user0")
+
+        self.profile.bio = "Gentleman farmer"
+        self.profile.save()
+        assert self.matches("can_help_document", "farmer")
+
+        self.user.first_name = "Fitzwilliam"
+        self.user.save()
+        assert self.matches("can_help_document", "fitzwilliam")
+
+    def test_experience_and_skill_changes(self):
+        exp = Experience.objects.create(
+            profile=self.profile,
+            skill=self.pandas,
+            level=3,
+            exp_type=Experience.Type.CAN_HELP,
+        )
+        assert self.matches("can_help_document", "pandas")
+        assert not self.matches("want_help_document", "pandas")
+
+        exp.exp_type = Experience.Type.WANT_HELP
+        exp.save()
+        assert not self.matches("can_help_document", "pandas")
+        assert self.matches("want_help_document", "pandas")
+
+        self.pandas.skill = "polars"
+        self.pandas.save()
+        assert self.matches("want_help_document", "polars")
+        assert not self.matches("want_help_document", "pandas")
+
+        exp.delete()
+        assert not self.matches("want_help_document", "polars")
 
 
 class SkillTest(TestCase):
     def setUp(self):
+        # skills from earlier tests are rolled back without signals
+        invalidate_vocabulary()
         create_test_users(1, "user", [])
 
     def test_skill_search(self):
@@ -1274,6 +2007,32 @@ class SkillTest(TestCase):
         response = c.get("/skill?term=PyT")
         assert response.json() == ["Python"]
 
+    def test_skill_search_ranking(self):
+        profile = Profile.objects.get(user__email="user0@buddy.com")
+        jupyter = Skill.objects.create(skill="jupyter")
+        pytest = Skill.objects.create(skill="pytest")
+        Skill.objects.create(skill="python")
+        Experience.objects.create(
+            profile=profile, skill=pytest, level=2, exp_type=Experience.Type.CAN_HELP
+        )
+        c = Client()
+        c.force_login(User.objects.get(email="user0@buddy.com"))
+
+        # prefix matches first, then by popularity
+        response = c.get("/skill?term=py")
+        assert response.json() == ["Pytest", "Python", "Jupyter"]
+
+        response = c.get("/skill?term=")
+        assert response.json() == []
+        response = c.get("/skill")
+        assert response.json() == []
+
+        for i in range(SKILL_SEARCH_LIMIT + 5):
+            Skill.objects.create(skill=f"pyskill{i}")
+        response = c.get("/skill?term=py")
+        assert len(response.json()) == SKILL_SEARCH_LIMIT
+        assert "Jupyter" not in response.json()
+
     def test_create_skill(self):
         assert not Skill.objects.filter(skill="python")
         Skill.objects.create(skill="python")
@@ -1340,6 +2099,967 @@ class SkillTest(TestCase):
         assert exp.exp_type == Experience.Type.CAN_HELP and exp.level == 4
 
 
+class SkillVocabularyTest(TestCase):
+    def setUp(self):
+        invalidate_vocabulary()
+        profile = Profile.objects.get(user=create_test_users(1, "user", [])[0])
+        for name in ["python", "pytest", "jupyter", "cpython", "django", "numpy"]:
+            Skill.objects.create(skill=name)
+        Experience.objects.create(
+            profile=profile,
+            skill=Skill.objects.get(skill="numpy"),
+            level=2,
+            exp_type=Experience.Type.CAN_HELP,
+        )
+
+    def test_matches_database_ranking(self):
+        vocabulary = get_vocabulary()
+        for term in ["py", "PY", "thon", "o", "n", "x", "django"]:
+            for limit in [1, 2, 10]:
+                expected = [
+                    skill.display_name
+                    for skill in Skill.objects.autocomplete(term, limit=limit)
+                ]
+                assert vocabulary.search(term, limit=limit) == expected
+
+    def test_no_queries_when_warm(self):
+        get_vocabulary()
+        with self.assertNumQueries(0):
+            assert get_vocabulary().search("py", limit=3) == [
+                "Python",
+                "Pytest",
+                "Numpy",
+            ]
+            assert "django" in get_vocabulary()
+            assert get_vocabulary().get_id("flask") is None
+
+    def test_invalidated_by_skill_writes(self):
+        assert "flask" not in get_vocabulary()
+        flask = Skill.objects.create(skill="flask")
+        assert get_vocabulary().get_id("flask") == flask.id
+
+        flask.display_name = "Flask!"
+        flask.save()
+        assert get_vocabulary().search("fla") == ["Flask!"]
+
+        flask.delete()
+        assert "flask" not in get_vocabulary()
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_skill_search", iterations=2, stdout=out)
+        output = out.getvalue()
+        assert "icontains" in output
+        assert "vocabulary" in output
+
+
+class AsyncViewsTest(LiveServerTestCase):
+    def setUp(self):
+        benchmarks.seed(profiles=20, experiences=4, requests=1, skills=20)
+        skill = Skill.objects.create(skill="uvicorn")
+        self.mentee = create_test_users(
+            1,
+            "mentee",
+            [{"skill": skill, "level": 1, "exp_type": Experience.Type.WANT_HELP}],
+        )[0]
+        self.mentor = create_test_users(
+            1,
+            "mentor",
+            [{"skill": skill, "level": 4, "exp_type": Experience.Type.CAN_HELP}],
+        )[0]
+
+    def test_asgi(self):
+        viewer = benchmarks._viewer()
+        client = AsyncClient()
+        client.force_login(viewer.user)
+        # Django 3.2's AsyncClient drops a data dict's query string
+        response = async_to_sync(client.get)(f"{reverse('skill_search')}?term=py")
+        assert response.status_code == 200
+        assert "Python" in response.json()
+
+        mentee, mentor = self.mentee, self.mentor
+        client.force_login(mentee)
+        # and overreads multipart bodies
+        response = async_to_sync(client.post)(
+            reverse("send_request", args=[mentor.uuid]),
+            urllib.parse.urlencode(
+                {"message": "Hi", "request_type": BuddyRequest.RequestType.REQUEST}
+            ),
+            content_type="application/x-www-form-urlencoded",
+        )
+        assert response.status_code == 302
+        assert BuddyRequest.objects.filter(
+            requestor=mentee,
+            requestee=mentor,
+            request_type=BuddyRequest.RequestType.REQUEST,
+            message="Hi",
+        ).exists()
+        response = async_to_sync(client.get)(
+            reverse("send_request", args=[mentor.uuid])
+        )
+        assert response.status_code == 403
+
+        response = async_to_sync(AsyncClient().get)(reverse("skill_search"))
+        assert response.status_code == 302
+
+    def test_async_views(self):
+        # routed to under ASGI only, see urls.py
+        viewer = benchmarks._viewer()
+        factory = AsyncRequestFactory()
+        request = factory.get(f"{reverse('skill_search')}?term=py")
+        request.user = viewer.user
+        response = async_to_sync(skill_search_async)(request)
+        assert "Python" in json.loads(response.content)
+
+        request = factory.get(reverse("skill_search"))
+        request.user = AnonymousUser()
+        assert async_to_sync(skill_search_async)(request).status_code == 302
+
+        request = factory.post(
+            reverse("send_request", args=[self.mentor.uuid]),
+            urllib.parse.urlencode(
+                {"message": "Hi", "request_type": BuddyRequest.RequestType.REQUEST}
+            ),
+            content_type="application/x-www-form-urlencoded",
+        )
+        request.user = self.mentee
+        response = async_to_sync(send_request_async)(request, uuid=self.mentor.uuid)
+        assert response.status_code == 302
+        assert BuddyRequest.objects.filter(
+            requestor=self.mentee, requestee=self.mentor, message="Hi"
+        ).exists()
+
+    def test_load_test(self):
+        result = benchmarks.load_test(self.live_server_url, concurrency=2, requests=9)
+        assert result.requests == 9
+        assert result.errors == 0
+        assert result.throughput > 0
+
+        out = StringIO()
+        call_command(
+            "load_test",
+            self.live_server_url,
+            concurrency=[1, 3],
+            requests=3,
+            path=["/does-not-exist"],
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        assert len(lines) == 3
+        assert lines[-1].split()[-1] == "3"
+
+
+class ImportExperiencesTest(TestCase):
+    def setUp(self):
+        invalidate_vocabulary()
+        self.python = Skill.objects.create(skill="python")
+        self.user = create_test_users(1, "user", [], looking_for_mentees=False)[0]
+        self.profile = Profile.objects.get(user=self.user)
+        self.staff = User.objects.create_user(
+            email="staff@buddy.com", first_name="Staff", is_staff=True
+        )
+        self.csv = (
+            "email,skill,level,exp_type\n"
+            "USER0@buddy.com,Python,4,can_help\n"
+            "user0@buddy.com,Rust,1,want_help\n"
+            "nobody@buddy.com,Python,2,can_help\n"
+        )
+
+    def test_parse_errors(self):
+        rows, errors = parse_rows(
+            "email,skill,level,exp_type\n"
+            "user0@buddy.com,Python,4,can_help\n"
+            ",Python,4,can_help\n"
+            "user0@buddy.com,Python,6,can_help\n"
+            "user0@buddy.com,Python,x,can_help\n"
+            "user0@buddy.com,Python,2,teach\n",
+            "csv",
+        )
+        assert rows == [ImportRow("user0@buddy.com", "python", 4, 1)]
+        assert errors == [
+            "Row 3: missing email",
+            "Row 4: level must be 1 to 5, not 6",
+            "Row 5: level must be 1 to 5, not x",
+            "Row 6: exp_type must be one of want_help, can_help, not teach",
+        ]
+
+        rows, errors = parse_rows(
+            json.dumps(
+                [
+                    {
+                        "email": "user0@buddy.com",
+                        "skill": "Rust",
+                        "level": 1,
+                        "exp_type": 0,
+                    },
+                    "user0@buddy.com",
+                ]
+            ),
+            "json",
+        )
+        assert rows == [ImportRow("user0@buddy.com", "rust", 1, 0)]
+        assert errors == ["Item 2: expected an object"]
+
+        with self.assertRaises(InvalidImport):
+            parse_rows("{not json", "json")
+        with self.assertRaises(InvalidImport):
+            parse_rows("", "xlsx")
+
+    def test_upsert(self):
+        rows, errors = parse_rows(self.csv, "csv")
+        assert errors == []
+        result = import_experiences(rows)
+        assert result.experiences_created == 2
+        assert result.experiences_updated == 0
+        assert result.skills_created == 1
+        assert result.profiles == 1
+        assert result.unknown_emails == ["nobody@buddy.com"]
+
+        rust = Skill.objects.get(skill="rust")
+        assert rust.display_name == "Rust"
+        assert get_vocabulary().get_id("rust") == rust.id
+        experience = Experience.objects.get(profile=self.profile, skill=self.python)
+        assert experience.level == 4
+        assert experience.exp_type == Experience.Type.CAN_HELP
+        eligibility = ProfileEligibility.objects.get(profile=self.profile)
+        assert eligibility.has_can_help
+        assert eligibility.has_want_help
+
+        # importing again updates instead of failing, the last row winning
+        rows, errors = parse_rows(
+            self.csv + "user0@buddy.com,python,5,want_help\n", "csv"
+        )
+        result = import_experiences(rows)
+        assert result.experiences_created == 0
+        assert result.experiences_updated == 2
+        assert result.skills_created == 0
+        assert Experience.objects.filter(profile=self.profile).count() == 2
+        experience.refresh_from_db()
+        assert experience.level == 5
+        assert experience.exp_type == Experience.Type.WANT_HELP
+        assert not ProfileEligibility.objects.get(profile=self.profile).has_can_help
+
+    def test_creates_missing_profile(self):
+        user = User.objects.create_user(email="new@buddy.com", first_name="New")
+        rows, errors = parse_rows(
+            json.dumps(
+                [
+                    {
+                        "email": "new@buddy.com",
+                        "skill": "python",
+                        "level": 3,
+                        "exp_type": "can_help",
+                    }
+                ]
+            ),
+            "json",
+        )
+        import_experiences(rows)
+        profile = Profile.objects.get(user=user)
+        assert profile.eligibility.has_can_help
+        assert Experience.objects.filter(profile=profile).count() == 1
+
+    def test_first_profile(self):
+        Profile.objects.create(user=self.user)
+        rows, errors = parse_rows(self.csv, "csv")
+        import_experiences(rows)
+        assert Profile.objects.for_user(self.user) == self.profile
+        assert Experience.objects.filter(profile=self.profile).count() == 2
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write(self.csv)
+        self.addCleanup(os.remove, file.name)
+
+        out = StringIO()
+        call_command("import_experiences", file.name, dry_run=True, stdout=out)
+        assert "3 valid rows" in out.getvalue()
+        assert not Experience.objects.exists()
+
+        out = StringIO()
+        call_command("import_experiences", file.name, stdout=out)
+        assert "2 experiences created" in out.getvalue()
+        assert Experience.objects.filter(profile=self.profile).count() == 2
+
+    def test_view(self):
+        url = reverse("import_experiences")
+        self.client.force_login(self.user)
+        assert self.client.get(url).status_code == 403
+
+        self.client.force_login(self.staff)
+        assert self.client.get(url).status_code == 200
+        upload = SimpleUploadedFile("cohort.csv", self.csv.encode())
+        response = self.client.post(url, {"file": upload})
+        assert response.status_code == 200
+        assert response.context["result"].experiences_created == 2
+        assert Experience.objects.filter(profile=self.profile).count() == 2
+
+        upload = SimpleUploadedFile(
+            "cohort.csv", b"email,skill,level,exp_type\nuser0@buddy.com,,1,can_help\n"
+        )
+        response = self.client.post(url, {"file": upload})
+        assert response.context["errors"] == ["Row 2: missing skill"]
+
+
+class BenchmarkDataTest(TestCase):
+    def generated(self):
+        return (
+            list(
+                User.objects.filter(email__endswith="@bench.buddy")
+                .order_by("email")
+                .values_list("email", "first_name", "is_active")
+            ),
+            list(
+                Experience.objects.filter(profile__user__email__endswith="@bench.buddy")
+                .order_by("profile__user__email", "skill__skill")
+                .values_list("profile__user__email", "skill__skill", "level", "exp_type")
+            ),
+            list(
+                BuddyRequest.objects.filter(requestor__email__endswith="@bench.buddy")
+                .order_by("requestor__email", "requestee__email", "request_type")
+                .values_list(
+                    "requestor__email", "requestee__email", "request_type", "status"
+                )
+            ),
+        )
+
+    def test_seed_is_deterministic(self):
+        result = benchmarks.seed(profiles=30, experiences=4, requests=2, skills=20)
+        assert result.users == 30
+        assert result.skills == 20
+        users, experiences, requests = self.generated()
+        assert len(users) == 30
+        assert len(experiences) == result.experiences > 0
+        assert len(requests) == result.requests > 0
+
+        assert benchmarks.clear() == 30
+        assert self.generated() == ([], [], [])
+        benchmarks.seed(profiles=30, experiences=4, requests=2, skills=20)
+        assert self.generated() == (users, experiences, requests)
+
+    def test_seeded_eligibility(self):
+        benchmarks.seed(profiles=20, experiences=3, skills=10)
+        for eligibility in ProfileEligibility.objects.filter(
+            profile__user__email__endswith="@bench.buddy"
+        ):
+            seeded = model_to_dict(eligibility)
+            assert seeded == model_to_dict(
+                ProfileEligibility.refresh(eligibility.profile)
+            )
+
+    def test_commands(self):
+        out = StringIO()
+        call_command(
+            "seed_benchmark_data", profiles=10, skills=5, clear=True, stdout=out
+        )
+        assert "10 users" in out.getvalue()
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            out = StringIO()
+            call_command(
+                "benchmark_views", scale=[20], iterations=1, save=baseline, stdout=out
+            )
+            for view in ["search", "profile", "requests"]:
+                assert view in out.getvalue()
+            # the benchmark's data is rolled back
+            assert User.objects.filter(email__endswith="@bench.buddy").count() == 10
+
+            with open(baseline) as baseline_file:
+                results = json.load(baseline_file)
+            for timing in results["20"]:
+                timing["queries"] -= 1
+            with open(baseline, "w") as baseline_file:
+                json.dump(results, baseline_file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    "benchmark_views",
+                    scale=[20],
+                    iterations=1,
+                    compare=baseline,
+                    tolerance=1000,
+                    stdout=StringIO(),
+                    stderr=StringIO(),
+                )
+
+
+class QueryInstrumentationTest(TestCase):
+    def setUp(self):
+        self.user = create_test_users(1, "user", [])[0]
+        self.client.force_login(self.user)
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        with self.assertLogs("buddy_mentorship.middleware", "INFO") as logs:
+            response = self.client.get(reverse("your_profile"))
+        timing = response["Server-Timing"]
+        assert timing.startswith("db;dur=")
+        assert "total;dur=" in timing
+
+        [line] = logs.records
+        message = line.getMessage()
+        assert 'path="/profile/"' in message
+        assert 'view="your_profile"' in message
+        assert "status=200" in message
+        queries = int(message.split(" queries=")[1].split()[0])
+        assert queries > 0
+        assert f'desc="{queries} queries"' in timing
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        response = self.client.get(reverse("your_profile"))
+        assert not response.has_header("Server-Timing")
+
+    def test_duplicates(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for i in range(3):
+                Skill.objects.filter(skill=f"skill{i}").exists()
+            Profile.objects.count()
+        assert recorder.count == 4
+        assert recorder.duplicates == 2
+        sql, count = recorder.most_repeated
+        assert count == 3
+        assert "buddy_mentorship_skill" in sql
+        assert recorder.slowest_sql
+        assert 0 < recorder.slowest_seconds <= recorder.seconds
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(METRICS_DIR=directory.name, METRICS_TOKEN="")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory.name
+        metrics.registry.clear()
+        self.user = create_test_users(1, "user", [])[0]
+
+    def test_render(self):
+        metrics.REQUEST_LATENCY.observe(0.03, view="profile")
+        metrics.REQUEST_LATENCY.observe(20, view="profile")
+        metrics.EMAILS.inc(outcome="sent")
+        # another worker's file
+        with open(os.path.join(self.directory, "1.json"), "w") as metrics_file:
+            json.dump({"emails_total": [[["sent"], 2]]}, metrics_file)
+
+        text = metrics.registry.render()
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert 'http_request_duration_seconds_bucket{view="profile",le="0.025"} 0' in text
+        assert 'http_request_duration_seconds_bucket{view="profile",le="0.05"} 1' in text
+        assert 'http_request_duration_seconds_bucket{view="profile",le="+Inf"} 2' in text
+        assert 'http_request_duration_seconds_count{view="profile"} 2' in text
+        assert 'emails_total{outcome="sent"} 3' in text
+
+        with self.assertRaises(ValueError):
+            metrics.EMAILS.inc(view="profile")
+
+    def test_retire(self):
+        with open(os.path.join(self.directory, "1.json"), "w") as metrics_file:
+            json.dump({"emails_total": [[["sent"], 2]]}, metrics_file)
+        with open(os.path.join(self.directory, "2.json"), "w") as metrics_file:
+            json.dump({"emails_total": [[["sent"], 3]]}, metrics_file)
+        metrics.registry.retire(1)
+        metrics.registry.retire(2)
+        metrics.registry.retire(3)
+        files = os.listdir(self.directory)
+        assert "1.json" not in files and "2.json" not in files
+        assert 'emails_total{outcome="sent"} 5' in metrics.registry.render()
+
+        metrics.EMAILS.inc(outcome="failed")
+        metrics.registry.retire()
+        assert f"{os.getpid()}.json" not in os.listdir(self.directory)
+        assert 'emails_total{outcome="failed"} 1' in metrics.registry.render()
+
+    def test_published(self):
+        metrics.EMAILS.inc(outcome="sent")
+        with mock.patch.dict(os.environ, {"DYNO": "worker.1"}):
+            metrics.registry.publish()
+        snapshot = MetricsSnapshot.objects.get(machine="worker.1")
+        assert snapshot.values["emails_total"] == [[["sent"], 1]]
+
+        # another dyno's totals are added to this one's, this one's aren't
+        # counted twice
+        snapshot.values["emails_total"] = [[["sent"], 4]]
+        snapshot.save()
+        with mock.patch.dict(os.environ, {"DYNO": "web.1"}):
+            assert 'emails_total{outcome="sent"} 5' in metrics.registry.render()
+        with mock.patch.dict(os.environ, {"DYNO": "worker.1"}):
+            assert 'emails_total{outcome="sent"} 1' in metrics.registry.render()
+
+    def test_requests_recorded(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("your_profile"))
+        self.client.get("/not-a-page/")
+        text = metrics.registry.render()
+        assert (
+            'http_requests_total{view="your_profile",method="GET",status="200"} 1'
+            in text
+        )
+        assert 'http_request_db_seconds_count{view="your_profile"} 1' in text
+        assert 'http_requests_total{view="unresolved",method="GET",status="404"} 1' in text
+        queries = [
+            line for line in text.splitlines() if line.startswith("db_queries_total")
+        ]
+        assert any('view="your_profile"' in line for line in queries)
+
+    def test_endpoint_access(self):
+        url = reverse("metrics")
+        self.client.force_login(self.user)
+        assert self.client.get(url).status_code == 403
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        assert response.status_code == 200
+        assert "# TYPE http_requests_total counter" in response.content.decode()
+
+        self.client.logout()
+        with override_settings(METRICS_TOKEN="secret"):
+            assert self.client.get(url).status_code == 403
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer secret")
+            assert response.status_code == 200
+
+
+class ConnectionHealthCheckTest(TestCase):
+    def mock_connection(self, usable=True, checks=True, open=True):
+        connection = mock.Mock()
+        connection.connection = object() if open else None
+        connection.settings_dict = {"CONN_HEALTH_CHECKS": checks}
+        connection.is_usable.return_value = usable
+        return connection
+
+    def test_closes_broken_connections(self):
+        broken = self.mock_connection(usable=False)
+        working = self.mock_connection()
+        unchecked = self.mock_connection(usable=False, checks=False)
+        closed = self.mock_connection(usable=False, open=False)
+        with mock.patch("buddy_mentorship.signals.connections") as connections:
+            connections.all.return_value = [broken, working, unchecked, closed]
+            check_connections()
+        broken.close.assert_called_once()
+        working.close.assert_not_called()
+        unchecked.is_usable.assert_not_called()
+        closed.is_usable.assert_not_called()
+
+
+class UserProfileMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = create_test_users(1, "user", [])[0]
+        self.profile = Profile.objects.get(user=self.user)
+
+    def test_user_loaded_with_profile(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("your_profile"))
+        user = response.wsgi_request.user
+        assert user == self.user
+        with self.assertNumQueries(0):
+            profile = response.wsgi_request.profile
+            assert profile == self.profile
+            assert profile.user == user
+            assert profile.eligibility.looking_for_mentors
+
+    def test_user_without_profile(self):
+        user = User.objects.create_user(email="new@buddy.com", first_name="New")
+        self.client.force_login(user)
+        response = self.client.get(reverse("your_profile"))
+        self.assertRedirects(response, reverse("edit_profile"))
+        assert response.wsgi_request.user == user
+        assert response.wsgi_request.profile is None
+
+    def test_session_checks(self):
+        self.client.force_login(self.user, "django.contrib.auth.backends.ModelBackend")
+        assert self.client.get(reverse("your_profile")).status_code == 200
+
+        # ModelBackend refuses inactive users
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse("your_profile"))
+        assert not response.wsgi_request.user.is_authenticated
+
+        # changing the password ends other sessions
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user, "django.contrib.auth.backends.ModelBackend")
+        self.user.set_password("new password")
+        self.user.save()
+        response = self.client.get(reverse("your_profile"))
+        assert not response.wsgi_request.user.is_authenticated
+
+    def test_for_user(self):
+        with Profile.objects.request_scope(), self.assertNumQueries(1):
+            assert Profile.objects.for_user(self.user) == self.profile
+            assert Profile.objects.for_user(self.user) == self.profile
+        assert Profile.objects.for_user(AnonymousUser()) is None
+
+        # outside of requests a changed profile is never stale
+        Profile.objects.filter(id=self.profile.id).update(bio="Changed")
+        assert Profile.objects.for_user(self.user).bio == "Changed"
+
+    def test_request_profile(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("your_profile"))
+        assert response.wsgi_request.profile == self.profile
+
+        self.client.logout()
+        response = self.client.get(reverse("login"))
+        assert response.wsgi_request.profile is None
+
+    def test_identity_map(self):
+        other = create_test_users(1, "other", [])[0]
+        without_profile = User.objects.create_user(email="new@buddy.com")
+        with Profile.objects.request_scope():
+            with self.assertNumQueries(1):
+                profiles = Profile.objects.for_users(
+                    [self.user, other, without_profile]
+                )
+            assert profiles[without_profile.id] is None
+            # other copies of the users, e.g. a BuddyRequest's requestor
+            with self.assertNumQueries(0):
+                assert Profile.objects.for_user(
+                    User(id=self.user.id, email=self.user.email)
+                ) is profiles[self.user.id]
+                assert Profile.objects.for_user(
+                    User(id=without_profile.id, email=without_profile.email)
+                ) is None
+
+            # saving a profile drops it from the map
+            profile = Profile.objects.get(user=other)
+            profile.bio = "Updated"
+            profile.save()
+            assert Profile.objects.for_user(User(id=other.id)).bio == "Updated"
+
+        with self.assertNumQueries(1):
+            Profile.objects.for_user(User(id=self.user.id))
+
+    def test_request_detail_queries(self):
+        other = create_test_users(1, "other", [])[0]
+        buddy_request = BuddyRequest.objects.create(
+            requestor=self.user,
+            requestee=other,
+            request_type=BuddyRequest.RequestType.REQUEST,
+            message="Hi",
+        )
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("request_detail", args=[buddy_request.id])
+            )
+        assert response.status_code == 200
+        profile_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "buddy_mentorship_profile"' in query["sql"]
+        ]
+        # the requestor's profile comes with the user
+        assert len(profile_queries) == 2
+
+
+class SessionPruningTest(TestCase):
+    def create_sessions(self, n, expire_date):
+        Session.objects.bulk_create(
+            Session(
+                session_key=f"{expire_date.timestamp()}-{i}",
+                session_data="",
+                expire_date=expire_date,
+            )
+            for i in range(n)
+        )
+
+    def test_prune_in_batches(self):
+        now = timezone.now()
+        self.create_sessions(25, now - dt.timedelta(days=1))
+        self.create_sessions(5, now + dt.timedelta(days=1))
+        with self.assertNumQueries(3):
+            assert prune_expired_sessions(batch_size=10) == 25
+        assert Session.objects.count() == 5
+
+        self.create_sessions(25, now - dt.timedelta(days=2))
+        assert prune_expired_sessions(batch_size=10, max_batches=2) == 20
+        assert Session.objects.count() == 10
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_no_database_sessions(self):
+        self.create_sessions(3, timezone.now() - dt.timedelta(days=1))
+        assert prune_expired_sessions() == 0
+        assert Session.objects.count() == 3
+
+    @override_settings(SESSION_COOKIE_AGE=60 * 60 * 24 * 14)
+    def test_report(self):
+        now = timezone.now()
+        # started today and two days ago
+        self.create_sessions(6, now + dt.timedelta(days=14))
+        self.create_sessions(8, now + dt.timedelta(days=12))
+        self.create_sessions(2, now - dt.timedelta(days=1))
+        report = session_report(days=7)
+        assert report.total == 16
+        assert report.expired == 2
+        assert len(report.started_per_day) == 7
+        assert report.started_per_day[now.date()] == 6
+        assert report.started_per_day[now.date() - dt.timedelta(days=2)] == 8
+        assert report.daily_rate == 2
+        assert report.steady_state == 28
+
+        out = StringIO()
+        call_command("prune_sessions", stdout=out)
+        assert "Deleted 2 expired sessions" in out.getvalue()
+        assert "14 sessions, 0 expired" in out.getvalue()
+
+    def test_failed_prune_is_logged(self):
+        command = SendQueuedEmailCommand(stdout=StringIO())
+        with mock.patch(
+            "buddy_mentorship.management.commands.send_queued_email."
+            "prune_expired_sessions",
+            side_effect=IntegrityError("locked"),
+        ), self.assertLogs(
+            "buddy_mentorship.management.commands.send_queued_email", "ERROR"
+        ) as logs:
+            command.run_task(command.prune_sessions)
+        assert "prune_sessions failed" in logs.output[0]
+
+
+class RowBudgetTest(TestCase):
+    def setUp(self):
+        create_test_users(3, "user", [])
+
+    def test_report(self):
+        report = budget_report(exact=True)
+        counts = {table.table: table.rows for table in report.tables}
+        assert counts["users_user"] == 3
+        assert counts["buddy_mentorship_profile"] == 3
+        assert report.total == sum(counts.values())
+        assert report.baseline is None
+        assert report.growth_per_day is None
+
+        # estimates of tables without statistics are counted
+        estimates = estimated_counts()
+        assert set(estimates) == set(counts)
+        assert estimates["users_user"] >= 0
+
+    def test_growth(self):
+        TableSizeSnapshot.objects.create(
+            taken_at=timezone.now() - dt.timedelta(days=2),
+            rows={"users_user": 1, "buddy_mentorship_profile": 1},
+        )
+        report = budget_report(exact=True)
+        growth = {table.table: table.growth_per_day for table in report.tables}
+        assert round(growth["users_user"], 3) == 1
+        assert round(growth["buddy_mentorship_profile"], 3) == 1
+        assert report.days_left is not None
+
+    def test_warning(self):
+        with override_settings(DB_ROW_LIMIT=10 ** 6):
+            assert budget_report(exact=True).status == "ok"
+        with override_settings(DB_ROW_LIMIT=10 ** 6, DB_ROW_WARNING=0):
+            with self.assertLogs("buddy_mentorship.budget", "WARNING"):
+                assert check_budget().status == "warning"
+        assert TableSizeSnapshot.objects.count() == 1
+        with override_settings(DB_ROW_LIMIT=1):
+            with self.assertRaises(CommandError):
+                call_command(
+                    "db_budget", exact=True, fail_on_warning=True, stdout=StringIO()
+                )
+
+    def test_command_and_dashboard(self):
+        out = StringIO()
+        call_command("db_budget", exact=True, save=True, stdout=out)
+        assert "users_user" in out.getvalue()
+        assert TableSizeSnapshot.objects.get().exact
+
+        url = reverse("admin:buddy_mentorship_tablesizesnapshot_changelist")
+        staff = User.objects.create_superuser("admin@buddy.com", "password")
+        self.client.force_login(staff)
+        response = self.client.get(url, {"exact": "1"})
+        assert response.status_code == 200
+        assert b"users_user" in response.content
+        assert response.context["report"].exact
+        response = self.client.post(f"{url}?exact=1")
+        assert response.status_code == 302
+        assert response.url == f"{url}?exact=1"
+        assert TableSizeSnapshot.objects.count() == 2
+
+        staff = User.objects.create_user(
+            email="staff@buddy.com", password="password", is_staff=True
+        )
+        self.client.force_login(staff)
+        assert self.client.get(url).status_code == 403
+        assert self.client.post(url).status_code == 403
+        assert TableSizeSnapshot.objects.count() == 2
+
+
+class GunicornConfigTest(TestCase):
+    def load_config(self, **environ):
+        path = os.path.join(os.path.dirname(settings.BASE_DIR), "gunicorn.conf.py")
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(path)
+
+    def test_sizing(self):
+        config = self.load_config(WEB_CONCURRENCY="3", GUNICORN_THREADS="8")
+        assert config["workers"] == 3
+        assert config["threads"] == 8
+        assert config["preload_app"]
+        assert config["max_requests_jitter"] == config["max_requests"] // 10
+
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": ""}):
+            # 256MB only has room for one worker of 150MB
+            with mock.patch.object(os, "sysconf", return_value=2 ** 14):
+                with mock.patch("builtins.open", side_effect=OSError):
+                    assert config["worker_count"]() == 1
+                    assert config["memory_limit"]() == 2 ** 28
+            assert 1 <= config["worker_count"]() <= 2 * config["cpu_count"]() + 1
+
+    def test_request_start(self):
+        config = self.load_config()
+        request_start = config["request_start"]
+        assert request_start("1600000000123") == 1600000000.123
+        assert request_start("t=1600000000.123") == 1600000000.123
+        with self.assertRaises(ValueError):
+            request_start("yesterday")
+
+
+class StaticFilesTest(TestCase):
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        collected = tempfile.TemporaryDirectory()
+        self.addCleanup(collected.cleanup)
+        os.makedirs(os.path.join(source.name, "css"))
+        with open(os.path.join(source.name, "css", "app.css"), "w") as css:
+            css.write("body { color: black; }\n" * 100)
+        bundles = os.path.join(source.name, "bundles")
+        os.makedirs(bundles)
+        with open(os.path.join(bundles, "main-0123456789abcdef0123.js"), "w") as js:
+            js.write("console.log('buddy');\n" * 100)
+
+        overrides = override_settings(
+            STATIC_ROOT=collected.name,
+            STATICFILES_DIRS=[source.name],
+            STATICFILES_FINDERS=[
+                "django.contrib.staticfiles.finders.FileSystemFinder"
+            ],
+            STATICFILES_STORAGE="whitenoise.storage.CompressedManifestStaticFilesStorage",
+            MIDDLEWARE=["buddy_mentorship.staticfiles.StaticFilesMiddleware"]
+            + settings.MIDDLEWARE,
+            DEBUG=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_hashed_files_are_immutable(self):
+        url = static("css/app.css")
+        assert url != "/static/css/app.css"
+        response = Client().get(url, HTTP_ACCEPT_ENCODING="gzip")
+        assert response.status_code == 200
+        assert response["Content-Encoding"] == "gzip"
+        assert "immutable" in response["Cache-Control"]
+
+        response = Client().get("/static/bundles/main-0123456789abcdef0123.js")
+        assert response.status_code == 200
+        assert "immutable" in response["Cache-Control"]
+
+    def test_unhashed_files_are_revalidated(self):
+        response = Client().get("/static/css/app.css")
+        assert response.status_code == 200
+        assert "immutable" not in response["Cache-Control"]
+        assert "max-age=60" in response["Cache-Control"]
+
+
+class CacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_namespaced_keys(self):
+        users = Namespace("users")
+        skills = Namespace("skills")
+        users.set("1", "alice")
+        skills.set("1", "python")
+        assert users.get("1") == "alice"
+        assert skills.get("1") == "python"
+        assert users.get("2", "nobody") == "nobody"
+
+        users.delete("1")
+        assert users.get("1") is None
+        assert skills.get("1") == "python"
+
+    def test_invalidate(self):
+        users = Namespace("users")
+        skills = Namespace("skills")
+        version = users.version()
+        users.set("1", "alice")
+        skills.set("1", "python")
+
+        users.invalidate()
+        assert users.version() != version
+        assert users.get("1") is None
+        assert skills.get("1") == "python"
+
+        # a lost version is never reused
+        cache.delete("users:version")
+        assert users.version() not in (version, version + 1)
+
+    def test_get_or_set(self):
+        users = Namespace("users")
+        calls = []
+
+        def load():
+            calls.append(1)
+            return "alice"
+
+        assert users.get_or_set("1", load) == "alice"
+        assert users.get_or_set("1", load) == "alice"
+        assert len(calls) == 1
+
+    def test_ttl(self):
+        users = Namespace("users", ttl=60)
+        with mock.patch("django.core.cache.backends.locmem.time.time") as now:
+            now.return_value = 1000
+            users.set("1", "alice")
+            users.set("2", "bob", ttl=None)
+            now.return_value = 1061
+            assert users.get("1") is None
+            assert users.get("2") == "bob"
+
+    def test_stats(self):
+        reset_stats()
+        users = Namespace("users")
+        users.set("1", "alice")
+        users.get("1")
+        users.get("1")
+        users.get("2")
+        users.get_or_set("3", lambda: "carol")
+
+        stats = get_stats()["users"]
+        assert stats.hits == 2
+        assert stats.misses == 2
+        assert stats.hit_rate == 0.5
+
+        out = StringIO()
+        call_command("cache_stats", reset=True, stdout=out)
+        assert "users: 2 hits, 2 misses (50.0% hit rate)" in out.getvalue()
+        assert get_stats() == {}
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": os.path.join(
+                    tempfile.gettempdir(), "buddy_mentorship_test_cache"
+                ),
+            }
+        }
+    )
+    def test_file_backend(self):
+        cache.clear()
+        users = Namespace("users")
+        users.set("1", "alice")
+        assert users.get("1") == "alice"
+        users.invalidate()
+        assert users.get("1") is None
+        cache.clear()
+
+
 class CompleteMentorshipViewTest(TestCase):
     def setUp(self):
         skill1 = Skill.objects.create(skill="pandas")
@@ -1441,3 +3161,23 @@ def create_test_users(
                 exp_type=exp["exp_type"],
             )
     return users
+
+
+def plan_index_names(queryset):
+    """
+    Names of the indexes postgres plans to use for queryset, from EXPLAIN
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        explained = cursor.fetchone()[0]
+    if isinstance(explained, str):
+        explained = json.loads(explained)
+    plans = [explained[0]["Plan"]]
+    names = set()
+    while plans:
+        plan = plans.pop()
+        if "Index Name" in plan:
+            names.add(plan["Index Name"])
+        plans.extend(plan.get("Plans", []))
+    return names
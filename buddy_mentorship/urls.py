@@ -13,12 +13,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.views.generic import TemplateView
 from django.urls import include, path
 
 from . import views
 
+# under WSGI an async view runs in a new event loop for every request
+if settings.SERVER_INTERFACE == "asgi":
+    skill_search, send_request = views.skill_search_async, views.send_request_async
+else:
+    skill_search, send_request = views.skill_search, views.send_request
+
 urlpatterns = [
     path("", views.index, name="index"),
     path("admin/", admin.site.urls),
@@ -30,9 +37,14 @@ urlpatterns = [
     path(
         "delete_skill/<int:pk>", views.DeleteExperience.as_view(), name="delete_skill",
     ),
-    path("skill", views.skill_search, name="skill_search"),
+    path("skill", skill_search, name="skill_search"),
     path("add_skill/<int:exp_type>", views.AddSkill.as_view(), name="add_skill"),
-    path("send_request/<uuid:uuid>", views.send_request, name="send_request"),
+    path(
+        "import_experiences/",
+        views.ImportExperiences.as_view(),
+        name="import_experiences",
+    ),
+    path("send_request/<uuid:uuid>", send_request, name="send_request"),
     path(
         "update_request/<int:buddy_request_id>",
         views.update_request,
@@ -44,6 +56,7 @@ urlpatterns = [
         name="complete_mentorship",
     ),
     path("social/", include("social_django.urls", namespace="social")),
+    path("metrics", views.metrics_view, name="metrics"),
     path("search/", views.Search.as_view(), name="search"),
     path(
         "release_notes/",
@@ -1,21 +1,40 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.contrib.postgres.search import SearchQuery, SearchVector, SearchRank
-from django.db.models import OuterRef, Subquery
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
 from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView
 from django.views.generic.edit import DeleteView, UpdateView
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic.edit import FormView
 
 from apps.users.models import User
 
-from .forms import ProfileEditForm, SkillForm
-from .models import BuddyRequest, Profile, Experience, Skill
-
+from . import metrics
+from .forms import ExperienceImportForm, ProfileEditForm, SkillForm
+from .imports import InvalidImport, import_experiences, parse_rows
+from .models import BuddyRequest, Profile, ProfileEligibility, Experience, Skill
+from .pagination import KeysetPaginator
+from .relationships import RelationshipState
+from .search import hydrate_results
+from .skills import get_vocabulary
+
+import hmac
+import os
 import urllib.parse
 
 
+# the skills sections of profile pages are cached until the profile changes,
+# see Profile.cache_stamp
+PROFILE_FRAGMENT_TTL = 60 * 60 * 24
+
+
 def index(request):
     return render(request, "buddy_mentorship/home.html", {"active_page": "home"})
 
@@ -23,78 +42,35 @@ def index(request):
 @login_required(login_url="login")
 def profile(request, profile_id=""):
     user = request.user
-    user_profile = Profile.objects.filter(user=user).first()
+    user_profile = request.profile
     if not profile_id:
         profile = user_profile
         profile_id = profile.id if profile else None
     if profile_id is None:
         return redirect("edit_profile")
-    profile = get_object_or_404(Profile, id=profile_id)
-    existing_request_to_user = None
-    existing_offer_to_user = None
-    existing_request_from_user = None
-    existing_offer_from_user = None
-    if user_profile != profile and user_profile != None:
-        existing_request_from_user = BuddyRequest.objects.find_by_users(
-            requestor=user_profile.user,
-            requestee=profile.user,
-            request_type=BuddyRequest.RequestType.REQUEST,
-        )
-        existing_offer_to_user = BuddyRequest.objects.find_by_users(
-            requestor=profile.user,
-            requestee=user_profile.user,
-            request_type=BuddyRequest.RequestType.OFFER,
-        )
-        existing_offer_from_user = BuddyRequest.objects.find_by_users(
-            requestor=user_profile.user,
-            requestee=profile.user,
-            request_type=BuddyRequest.RequestType.OFFER,
-        )
-        existing_request_to_user = BuddyRequest.objects.find_by_users(
-            requestor=profile.user,
-            requestee=user_profile.user,
-            request_type=BuddyRequest.RequestType.REQUEST,
+    if user_profile is not None and user_profile.id == profile_id:
+        profile = user_profile
+    else:
+        profile = get_object_or_404(
+            Profile.objects.select_related("user", "eligibility"), id=profile_id
         )
-
-    can_request = can_request_as_mentor(request.user, profile.user)
-    can_offer = can_offer_to_mentor(request.user, profile.user)
+    relationship = RelationshipState.load(user, user_profile, profile)
     context = {
-        "existing_request_to_user": existing_request_to_user,
-        "existing_offer_to_user": existing_offer_to_user,
-        "existing_request_from_user": existing_request_from_user,
-        "existing_offer_from_user": existing_offer_from_user,
-        "can_request": can_request,
-        "can_offer": can_offer,
-        "cannot_request_not_looking": (
-            not can_request
-            and not existing_request_from_user
-            and not existing_offer_to_user
-            and user != user_profile
-            and not profile.looking_for_mentees
-        ),
-        "cannot_offer_not_looking": (
-            not can_offer
-            and not existing_request_to_user
-            and not existing_offer_from_user
-            and user != user_profile
-            and not profile.looking_for_mentors
-        ),
-        "cannot_request_no_skills": (
-            not can_request
-            and not existing_request_from_user
-            and not existing_offer_to_user
-            and user != user_profile
-            and profile.looking_for_mentees
-        ),
-        "cannot_offer_no_skills": (
-            not can_offer
-            and not existing_request_to_user
-            and not existing_offer_from_user
-            and user != user_profile
-            and profile.looking_for_mentors
-        ),
+        "relationship": relationship,
+        "existing_request_to_user": relationship.request_to_viewer,
+        "existing_offer_to_user": relationship.offer_to_viewer,
+        "existing_request_from_user": relationship.request_from_viewer,
+        "existing_offer_from_user": relationship.offer_from_viewer,
+        "can_request": relationship.can_request,
+        "can_offer": relationship.can_offer,
+        "cannot_request_not_looking": relationship.cannot_request_not_looking,
+        "cannot_offer_not_looking": relationship.cannot_offer_not_looking,
+        "cannot_request_no_skills": relationship.cannot_request_no_skills,
+        "cannot_offer_no_skills": relationship.cannot_offer_no_skills,
         "profile": profile,
         "user_profile": user_profile,
+        "is_owner": profile.user_id == user.id,
+        "profile_fragment_ttl": PROFILE_FRAGMENT_TTL,
         "active_page": "profile",
         "request_type": BuddyRequest.RequestType,
         "exp_types": Experience.Type,
@@ -103,14 +79,61 @@ def profile(request, profile_id=""):
     return render(request, "buddy_mentorship/profile.html", context)
 
 
+def async_login_required(view):
+    """
+    login_required for async views, which Django's decorator doesn't support
+    before 5.0. Loads request.user outside of the event loop, so the view can
+    use it without querying.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path(), "login")
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
 @login_required(login_url="login")
 def send_request(request, uuid):
-    user = request.user
-    requestee = User.objects.get(uuid=uuid)
     if request.method != "POST":
         return HttpResponseForbidden("Error - page accessed incorrectly")
-    message = request.POST["message"]
     request_type = request.POST["request_type"]
+    sent = create_request(request.user, uuid, request.POST["message"], request_type)
+    return sent_response(sent, request_type)
+
+
+@async_login_required
+async def send_request_async(request, uuid):
+    """
+    send_request for ASGI, see urls.py
+    """
+    if request.method != "POST":
+        return HttpResponseForbidden("Error - page accessed incorrectly")
+    request_type = request.POST["request_type"]
+    sent = await sync_to_async(create_request)(
+        request.user, uuid, request.POST["message"], request_type
+    )
+    return sent_response(sent, request_type)
+
+
+def sent_response(sent: bool, request_type):
+    if sent:
+        return redirect("requests")
+
+    if int(request_type) == int(BuddyRequest.RequestType.REQUEST):
+        return HttpResponseForbidden(f"You cannot send this user a request.")
+    if int(request_type) == int(BuddyRequest.RequestType.OFFER):
+        return HttpResponseForbidden(f"You cannot send this user an offer.")
+
+
+def create_request(user, uuid, message, request_type) -> bool:
+    """
+    Sends the request or offer from user to the user with uuid if they may.
+    Returns whether it was sent.
+    """
+    requestee = User.objects.get(uuid=uuid)
 
     can_send_request = int(request_type) == int(
         BuddyRequest.RequestType.REQUEST
@@ -127,47 +150,17 @@ def send_request(request, uuid):
             message=message,
             request_type=request_type,
         )
-        return redirect("requests")
-
-    if int(request_type) == int(BuddyRequest.RequestType.REQUEST):
-        return HttpResponseForbidden(f"You cannot send this user a request.")
-    if int(request_type) == int(BuddyRequest.RequestType.OFFER):
-        return HttpResponseForbidden(f"You cannot send this user an offer.")
+        return True
+    return False
 
 
 # needs to be updated as we expand profile model
 def can_request_as_mentor(mentee, mentor):
-    mentee_profile = Profile.objects.filter(user=mentee).first()
-    mentor_profile = Profile.objects.filter(user=mentor).first()
-
-    if (not mentee_profile) or (not mentor_profile):
-        return False
-
-    return (
-        mentee != mentor
-        and mentee.is_active
-        and mentor.is_active
-        and required_experiences(mentee, mentor)
-        and mentor_profile.looking_for_mentees
-        and not existing_requests(mentee, mentor)
-    )
+    return RelationshipState.between(mentee, mentor).can_request
 
 
 def can_offer_to_mentor(mentor, mentee):
-    mentor_profile = Profile.objects.filter(user=mentor).first()
-    mentee_profile = Profile.objects.filter(user=mentee).first()
-
-    if (not mentor_profile) or (not mentee_profile):
-        return False
-
-    return (
-        mentor != mentee
-        and mentor.is_active
-        and mentee.is_active
-        and required_experiences(mentee, mentor)
-        and mentee_profile.looking_for_mentors
-        and not existing_requests(mentee, mentor)
-    )
+    return RelationshipState.between(mentor, mentee).can_offer
 
 
 # helper function for can_request_as_mentor and can_offer_to_mentor
@@ -187,27 +180,35 @@ def existing_requests(mentee, mentor):
 # helper function for can_request_as_mentor and can_offer_to_mentor
 # checks mentee has skills they want help with and mentor has skills they need help with
 def required_experiences(mentee, mentor):
-    mentee_experiences = Experience.objects.filter(profile__user=mentee).all()
-    mentor_experiences = Experience.objects.filter(profile__user=mentor).all()
-    return any(
-        [
-            experience.exp_type == Experience.Type.WANT_HELP
-            for experience in mentee_experiences
-        ]
-    ) and any(
-        [
-            experience.exp_type == Experience.Type.CAN_HELP
-            for experience in mentor_experiences
-        ]
+    eligibility = ProfileEligibility.objects
+    return (
+        eligibility.filter(profile__user=mentee, has_want_help=True).exists()
+        and eligibility.filter(profile__user=mentor, has_can_help=True).exists()
     )
 
 
+SKILL_SEARCH_LIMIT = 10
+
+
 @login_required(login_url="login")
 def skill_search(request):
-    term = request.GET.get("term", None)
+    term = request.GET.get("term", "").strip()
 
-    skills = Skill.objects.filter(skill__icontains=term)
-    return JsonResponse([skill.display_name for skill in skills], safe=False)
+    skills = get_vocabulary().search(term, limit=SKILL_SEARCH_LIMIT)
+    return JsonResponse(skills, safe=False)
+
+
+@async_login_required
+async def skill_search_async(request):
+    """
+    skill_search for ASGI, see urls.py
+    """
+    term = request.GET.get("term", "").strip()
+
+    # the vocabulary reads its version from the cache, a query with the db cache
+    vocabulary = await sync_to_async(get_vocabulary)()
+    skills = vocabulary.search(term, limit=SKILL_SEARCH_LIMIT)
+    return JsonResponse(skills, safe=False)
 
 
 class AddSkill(LoginRequiredMixin, FormView):
@@ -222,26 +223,26 @@ class AddSkill(LoginRequiredMixin, FormView):
         return context
 
     def form_valid(self, form: SkillForm):
-        user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = self.request.profile
+        if profile is None:
+            return redirect("edit_profile")
         exp_type = form.cleaned_data.get("exp_type")
         skill = form.cleaned_data.get("skill").lower()
         level = form.cleaned_data.get("level")
 
-        existing_skill = Skill.objects.filter(skill=skill).first()
-        if existing_skill is None:
-            existing_skill = Skill.objects.create(skill=skill, display_name=skill)
+        skill_id = get_vocabulary().get_id(skill)
+        if skill_id is None:
+            skill_id = Skill.objects.get_or_create(
+                skill=skill, defaults={"display_name": skill}
+            )[0].id
 
         existing_experience = Experience.objects.filter(
-            skill=existing_skill, profile=profile
+            skill_id=skill_id, profile=profile
         ).first()
         if existing_experience is None:
-            existing_experience = Experience.objects.create(
-                skill=existing_skill, profile=profile, level=1, exp_type=exp_type,
+            Experience.objects.create(
+                skill_id=skill_id, profile=profile, level=level, exp_type=exp_type,
             )
-            existing_experience.level = level
-            existing_experience.exp_type = exp_type
-            existing_experience.save()
         else:
             return redirect(f"/edit_skill/{existing_experience.id}")
 
@@ -251,6 +252,34 @@ class AddSkill(LoginRequiredMixin, FormView):
         return super().form_invalid(form)
 
 
+class ImportExperiences(LoginRequiredMixin, UserPassesTestMixin, FormView):
+    login_url = "login"
+    template_name = "buddy_mentorship/import_experiences.html"
+    form_class = ExperienceImportForm
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def form_valid(self, form: ExperienceImportForm):
+        upload = form.cleaned_data.get("file")
+        import_format = form.cleaned_data.get("format") or (
+            os.path.splitext(upload.name)[1].lstrip(".").lower()
+        )
+        try:
+            rows, errors = parse_rows(upload.read().decode("utf-8-sig"), import_format)
+        except (UnicodeDecodeError, InvalidImport) as error:
+            form.add_error("file", str(error))
+            return self.form_invalid(form)
+        if errors:
+            return self.render_to_response(
+                self.get_context_data(form=form, errors=errors)
+            )
+        result = import_experiences(rows)
+        return self.render_to_response(
+            self.get_context_data(form=self.form_class(), result=result)
+        )
+
+
 class ProfileEdit(LoginRequiredMixin, FormView):
     login_url = "login"
 
@@ -261,7 +290,7 @@ class ProfileEdit(LoginRequiredMixin, FormView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        profile = Profile.objects.filter(user=self.request.user).first()
+        profile = self.request.profile
 
         context["first_name"] = user.first_name
         context["last_name"] = user.last_name
@@ -358,51 +387,64 @@ class Search(LoginRequiredMixin, ListView):
     template_name = "buddy_mentorship/search.html"
 
     paginate_by = 5
+    # None, "exact" or "approximate", see KeysetPaginator
+    count_mode = None
 
-    queryset = Profile.objects.all().order_by("-id")
+    queryset = (
+        Profile.objects.select_related("user")
+        .defer("can_help_document", "want_help_document")
+        .order_by("-id")
+    )
 
     def get_queryset(self):
-
         search_type = self.request.GET.get("type", "mentor")
         if search_type == "mentee":
             all_qualified = self.queryset.filter(
-                experience__exp_type=Experience.Type.WANT_HELP, looking_for_mentors=True
+                eligibility__has_want_help=True,
+                eligibility__looking_for_mentors=True,
+                eligibility__is_active=True,
             ).exclude(user=self.request.user)
+            document = "want_help_document"
         if search_type == "mentor":
             all_qualified = self.queryset.filter(
-                experience__exp_type=Experience.Type.CAN_HELP, looking_for_mentees=True
+                eligibility__has_can_help=True,
+                eligibility__looking_for_mentees=True,
+                eligibility__is_active=True,
             ).exclude(user=self.request.user)
+            document = "can_help_document"
 
         query_text = self.request.GET.get("q", "")
         if query_text != "":
-            search_vector = SearchVector(
-                "user__first_name",
-                "user__last_name",
-                "bio",
-                "experience__skill__skill",
-            )
             search_query = SearchQuery(
                 query_text.replace(" ", " | "), search_type="raw"
             )
             search_results = (
-                all_qualified.annotate(
-                    search=search_vector, rank=SearchRank(search_vector, search_query),
+                all_qualified.filter(**{document: search_query})
+                # ts_rank is a real, which doesn't round-trip through the
+                # cursor's float; a double compares equal to it again
+                .annotate(
+                    rank=Cast(SearchRank(F(document), search_query), FloatField())
                 )
-                .filter(search=search_query, id=OuterRef("id"))
-                .distinct("id")
-            )
-
-            ranked = (
-                Profile.objects.annotate(rank=Subquery(search_results.values("rank")))
-                .filter(id__in=Subquery(search_results.values("id")))
-                .order_by("-rank")
+                .order_by("-rank", "-id")
             )
-
-            search_results = ranked
         else:
-            search_results = all_qualified.distinct("id")
+            search_results = all_qualified
         return search_results
 
+    def paginate_queryset(self, queryset, page_size):
+        search_type = self.request.GET.get("type", "mentor")
+        query_text = self.request.GET.get("q", "")
+        paginator = KeysetPaginator(
+            queryset,
+            ["rank", "id"] if query_text else ["id"],
+            page_size,
+            # cursors only work for the search they were made for
+            salt=f"search:{search_type}:{query_text}",
+            count_mode=self.count_mode,
+        )
+        page = paginator.page(self.request.GET.get("cursor"))
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["active_page"] = "search"
@@ -412,16 +454,11 @@ class Search(LoginRequiredMixin, ListView):
         context["query_text"] = query_text
         quoted_query_text = urllib.parse.quote_plus(query_text)
 
-        results = []
-        for profile in context["page_obj"].object_list:
-            result = {}
-            result["profile"] = profile
-            result["can_help"] = profile.get_top_can_help(query_text)
-            result["want_help"] = profile.get_top_want_help(query_text)
-            results.append(result)
-        context["results"] = results
+        context["results"] = hydrate_results(
+            context["page_obj"].object_list, query_text
+        )
 
-        profile = Profile.objects.filter(user=self.request.user).first()
+        profile = self.request.profile
         context["looking_for_mentors"] = (
             profile.looking_for_mentors if profile else False
         )
@@ -429,21 +466,34 @@ class Search(LoginRequiredMixin, ListView):
             profile.looking_for_mentees if profile else False
         )
 
-        if context["page_obj"].has_previous():
-            context[
-                "first_page_url"
-            ] = f"?q={ quoted_query_text }&type={ context['search_type'] }&page=1"
-            context["prev_page_url"] = (
-                f"?q={ quoted_query_text }&type={ context['search_type'] }"
-                f"&page={ context['page_obj'].previous_page_number()}"
-            )
-        if context["page_obj"].has_next():
-            context["next_page_url"] = (
-                f"?q={ quoted_query_text }&type={ context['search_type'] }"
-                f"&page={ context['page_obj'].next_page_number()}"
-            )
-            context[
-                "last_page_url"
-            ] = f"?q={ quoted_query_text }&type={ context['search_type'] }&page=last"
+        base_url = f"?q={ quoted_query_text }&type={ context['search_type'] }"
+        page = context["page_obj"]
+        paginator = context["paginator"]
+        if page.has_previous():
+            context["first_page_url"] = base_url
+            context["prev_page_url"] = f"{base_url}&cursor={page.previous_cursor}"
+        if page.has_next():
+            context["next_page_url"] = f"{base_url}&cursor={page.next_cursor}"
+            context["last_page_url"] = f"{base_url}&cursor={paginator.last_cursor}"
+        context["result_count"] = paginator.count
+        context["result_count_is_approximate"] = paginator.count_is_approximate
 
         return context
+
+
+def metrics_view(request):
+    """
+    The metrics of every process on this machine and those published by other
+    machines in the Prometheus text format, for a scraper with the
+    METRICS_TOKEN bearer token or for staff.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        expected = f"Bearer {token}"
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            return HttpResponseForbidden()
+    elif not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,172 @@
+"""
+Gunicorn settings, read from the working directory by every `gunicorn` start
+(Procfile and start.sh). Environment variables override the sizing:
+
+    WEB_CONCURRENCY         worker processes (Heroku sets it from the dyno's memory)
+    GUNICORN_THREADS        threads per worker, default 4
+    GUNICORN_WORKER_MEMORY  megabytes one worker needs, default 150, caps the workers
+    GUNICORN_MAX_REQUESTS   requests before a worker is replaced, default 1000, 0 never
+    GUNICORN_PRELOAD        load Django before forking, default true
+    GUNICORN_SLOW_REQUEST   seconds after which a request is logged, default 5
+    SERVER_INTERFACE        wsgi (default) or asgi
+
+Views spend most of their time waiting on Postgres and the mail server, so each
+worker runs several threads: a request blocked on I/O doesn't hold up the others.
+"""
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv(override=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name) or default)
+
+
+def cpu_count() -> int:
+    """
+    CPUs this process may run on, which can be fewer than the machine has
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_limit() -> int:
+    """
+    Bytes of memory available, the container's limit when there is one
+    """
+    for path in [
+        "/sys/fs/cgroup/memory.max",
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+    ]:
+        try:
+            with open(path) as limit_file:
+                limit = limit_file.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit():
+            # cgroup v1 reports "no limit" as a huge number
+            physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+            return min(int(limit), physical)
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def worker_count() -> int:
+    """
+    WEB_CONCURRENCY if set, otherwise 2 per CPU plus one, as many as fit in
+    memory at GUNICORN_WORKER_MEMORY megabytes each
+    """
+    if os.environ.get("WEB_CONCURRENCY"):
+        return max(int(os.environ["WEB_CONCURRENCY"]), 1)
+    by_cpu = 2 * cpu_count() + 1
+    by_memory = memory_limit() // (_env_int("GUNICORN_WORKER_MEMORY", 150) * 2**20)
+    return max(min(by_cpu, by_memory), 1)
+
+
+def request_start(value: str) -> float:
+    """
+    Seconds since the epoch from an X-Request-Start header, which Heroku's
+    router sets in milliseconds and nginx as "t=<seconds>"
+    """
+    value = value.strip()
+    if value.startswith("t="):
+        value = value[2:]
+    start = float(value)
+    # milliseconds (or microseconds) since the epoch
+    while start > 1e11:
+        start /= 1000
+    return start
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# SERVER_INTERFACE=asgi serves buddy_mentorship.asgi with uvicorn's worker; the
+# request hooks below only run with wsgi
+if os.environ.get("SERVER_INTERFACE", "wsgi").lower() == "asgi":
+    wsgi_app = "buddy_mentorship.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "buddy_mentorship.wsgi:application"
+    worker_class = "gthread"
+workers = worker_count()
+threads = _env_int("GUNICORN_THREADS", 4)
+
+# load Django once in the master, workers share its memory copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ["1", "true"]
+
+# replace workers now and then, so leaks don't grow forever; the jitter keeps
+# them from all restarting at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = max_requests // 10
+
+# Heroku's router gives up after 30 seconds
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = timeout
+
+# heartbeat files on a disk can stall workers in containers
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = None
+errorlog = "-"
+
+slow_request = float(os.environ.get("GUNICORN_SLOW_REQUEST") or 5)
+
+
+def on_starting(server):
+    # workers that exited before this start left their metrics files behind
+    from buddy_mentorship.metrics import registry
+
+    registry.clear()
+
+
+def worker_exit(server, worker):
+    # the values counted since the last flush
+    from buddy_mentorship.metrics import registry
+
+    registry.flush()
+
+
+def child_exit(server, worker):
+    # runs in the master, one worker at a time
+    from buddy_mentorship.metrics import registry
+
+    registry.retire(worker.pid)
+
+
+def when_ready(server):
+    # nothing opened while preloading may be shared with the forked workers
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def pre_request(worker, req):
+    req.started = time.perf_counter()
+    header = dict(req.headers).get("X-REQUEST-START")
+    if header:
+        from buddy_mentorship import metrics
+
+        try:
+            waited = time.time() - request_start(header)
+        except ValueError:
+            return
+        metrics.REQUEST_QUEUE_TIME.observe(max(waited, 0))
+
+
+def post_request(worker, req, environ, resp):
+    elapsed = time.perf_counter() - req.started
+    if elapsed >= slow_request:
+        worker.log.warning(
+            "Slow request: method=%s path=%s status=%s total_ms=%.1f pid=%s",
+            req.method,
+            req.path,
+            resp.status_code,
+            elapsed * 1000,
+            worker.pid,
+        )
@@ -1,7 +1,10 @@
 #!/bin/sh
 
 if [[ $DYNO == "web"* ]]; then
-  gunicorn buddy_mentorship.wsgi:application -w 4 --bind 0.0.0.0:$PORT
+  gunicorn
+elif  [[ $DYNO == "worker"* ]]; then
+  python manage.py send_queued_email --loop
 elif  [[ $DYNO == "release"* ]]; then
   python manage.py migrate
+  python manage.py createcachetable
 fi
\ No newline at end of file
@@ -10,11 +10,11 @@ module.exports = {
     output: {
         path: path.resolve('./frontend/static/bundles/'),
         publicPath: '/static/bundles/',
-        filename: "[name]-[hash].js",
+        filename: "[name]-[contenthash].js",
     },
 
     plugins: [
-        new BundleTracker({ filename: './frontend/static/webpack-stats.json' }),
+        new BundleTracker({ filename: './frontend/webpack-stats.json' }),
     ],
     module: {
         rules: [